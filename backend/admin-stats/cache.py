@@ -0,0 +1,387 @@
+'''
+Read-through кеш собранных ответов: в памяти тёплого контейнера с TTL и вытеснением
+давно не читанных записей (LRU), плюс необязательный общий бэкенд через CACHE_URL:
+redis://... или file:///путь (локальная замена Redis для разработки и бенчмарков).
+
+С общим бэкендом сброс ключа (invalidate) увеличивает его поколение в бэкенде,
+поэтому запись в одной функции (measurements, photos) сбрасывает кеш другой (projects):
+локальная копия действительна, только пока её поколение совпадает с общим.
+Без бэкенда сброс виден только своему контейнеру, и записи живут CACHE_LOCAL_TTL.
+
+Cache(..., stale=N) — stale-while-revalidate: ещё N секунд после TTL устаревшая запись отдаётся сразу
+всем, кроме одного запроса — держателя аренды ключа, который пересчитывает её в своём вызове
+(фоновых потоков нет: контейнер замораживается после ответа). Загрузку при промахе тоже ведёт держатель аренды
+в общем бэкенде (или в контейнере без него), остальные ждут его результат до CACHE_LEASE_WAIT.
+'''
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+
+import telemetry
+
+# 0 — каждый get_or_load вызывает loader (бенчмарк замеряет запросы, а не попадания в кеш)
+ENABLED = os.environ.get('CACHE_ENABLED', '1') != '0'
+CACHE_URL = os.environ.get('CACHE_URL', '')
+TTL = float(os.environ.get('CACHE_TTL', '300'))
+# Без общего бэкенда сбросы из других функций сюда не доходят, поэтому записи живут недолго
+LOCAL_TTL = float(os.environ.get('CACHE_LOCAL_TTL', '10'))
+MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '1000'))
+# Аренда пересчёта истекает сама, если исполнитель упал или контейнер заморожен
+LEASE_TTL = float(os.environ.get('CACHE_LEASE_TTL', '30'))
+LEASE_WAIT = float(os.environ.get('CACHE_LEASE_WAIT', '5'))
+LEASE_POLL = 0.05
+PREFIX = 'remont:'
+
+
+class RedisBackend:
+    '''Общий бэкенд на Redis; клиент redis импортируется при первом обращении'''
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    def get_many(self, keys: list) -> list:
+        with telemetry.external('redis'):
+            values = self.client().mget(keys)
+        return [v.decode('utf-8') if v is not None else None for v in values]
+
+    def set(self, key: str, value: str, ttl: float):
+        with telemetry.external('redis'):
+            self.client().set(key, value, px=int(ttl * 1000))
+
+    def incr(self, key: str):
+        with telemetry.external('redis'):
+            self.client().incr(key)
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        '''Записывает ключ, только если его нет (SET NX)'''
+        with telemetry.external('redis'):
+            return bool(self.client().set(key, value, px=int(ttl * 1000), nx=True))
+
+    def delete(self, key: str):
+        with telemetry.external('redis'):
+            self.client().delete(key)
+
+
+class FileBackend:
+    '''Локальная замена общего бэкенда: по файлу на ключ в каталоге, общий для процессов одной машины'''
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _read(self, key: str):
+        try:
+            with open(self._file(key), encoding='utf-8') as f:
+                expires, value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if expires is not None and expires < time.time():
+            return None
+        return value
+
+    def _write(self, key: str, value: str, expires):
+        target = self._file(key)
+        tmp = f'{target}.{os.getpid()}.{threading.get_ident()}'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump([expires, value], f)
+        os.replace(tmp, target)
+
+    def get_many(self, keys: list) -> list:
+        return [self._read(key) for key in keys]
+
+    def set(self, key: str, value: str, ttl: float):
+        self._write(key, value, time.time() + ttl)
+
+    def incr(self, key: str):
+        with self._lock:
+            self._write(key, str(int(self._read(key) or 0) + 1), None)
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        target = self._file(key)
+        if self._read(key) is None:
+            # Истёкшая запись не мешает новой
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+        tmp = f'{target}.{os.getpid()}.{threading.get_ident()}'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump([time.time() + ttl, value], f)
+        try:
+            os.link(tmp, target)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+
+def _backend():
+    if CACHE_URL.startswith(('redis://', 'rediss://')):
+        return RedisBackend(CACHE_URL)
+    if CACHE_URL.startswith('file://'):
+        return FileBackend(CACHE_URL[len('file://'):])
+    return None
+
+
+class Cache:
+    '''Кеш значений, сериализуемых в JSON, с загрузкой при промахе'''
+
+    def __init__(self, name: str, ttl: float = None, max_entries: int = MAX_ENTRIES, stale: float = 0):
+        self.name = name
+        self.shared = _backend()
+        self.ttl = ttl if ttl is not None else (TTL if self.shared else LOCAL_TTL)
+        self.stale = stale
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._leases = set()
+        self._counters = {
+            'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0, 'refresh_errors': 0,
+            'evictions': 0, 'invalidations': 0, 'purges': 0, 'backend_errors': 0
+        }
+        _caches[name] = self
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _shared_key(self, kind: str, key: str) -> str:
+        return f'{PREFIX}{self.name}:{kind}:{key}'
+
+    def _get_local(self, key: str, generation):
+        '''(значение, свежее ли) или None'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, entry_generation, fresh_until, expires = entry
+            now = time.monotonic()
+            if expires < now or entry_generation != generation:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value, fresh_until >= now
+
+    def _put_local(self, key: str, value, generation, fresh_for: float = None):
+        fresh_until = time.monotonic() + (self.ttl if fresh_for is None else fresh_for)
+        with self._lock:
+            self._entries[key] = (value, generation, fresh_until, fresh_until + self.stale)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def _lookup(self, key: str):
+        '''Поколение ключа, значение из памяти или общего бэкенда и его свежесть'''
+        generation = shared_value = None
+        if self.shared:
+            epoch, key_generation, shared_value = self.shared.get_many(
+                [self._shared_key('gen', '*'), self._shared_key('gen', key), self._shared_key('val', key)])
+            generation = f'{epoch or 0}.{key_generation or 0}'
+
+        entry = self._get_local(key, generation)
+        if (entry is None or not entry[1]) and shared_value is not None:
+            # Устаревшую локальную копию мог уже обновить другой контейнер
+            stored_generation, value, *rest = json.loads(shared_value)
+            fresh_for = rest[0] - time.time() if rest else self.ttl
+            if stored_generation == generation and fresh_for + self.stale > 0 and (entry is None or fresh_for > 0):
+                self._put_local(key, value, generation, fresh_for)
+                entry = (value, fresh_for > 0)
+        return generation, entry
+
+    def _store(self, key: str, value, generation, invalidations: int):
+        if self.shared:
+            try:
+                self.shared.set(
+                    self._shared_key('val', key),
+                    json.dumps([generation, value, time.time() + self.ttl], ensure_ascii=False),
+                    self.ttl + self.stale)
+            except Exception:
+                self._count('backend_errors')
+                return
+        else:
+            with self._lock:
+                if invalidations != self._counters['invalidations']:
+                    # Пока значение загружалось, ключи сбросили: оно могло устареть
+                    return
+        self._put_local(key, value, generation)
+
+    def _acquire_lease(self, key: str) -> bool:
+        '''Право пересчитать ключ: одно на контейнер и, с общим бэкендом, одно на все контейнеры'''
+        with self._lock:
+            if key in self._leases:
+                return False
+            self._leases.add(key)
+        if self.shared:
+            try:
+                if not self.shared.add(self._shared_key('lease', key), '1', LEASE_TTL):
+                    with self._lock:
+                        self._leases.discard(key)
+                    return False
+            except Exception:
+                self._count('backend_errors')
+        return True
+
+    def _release_lease(self, key: str):
+        with self._lock:
+            self._leases.discard(key)
+        if self.shared:
+            try:
+                self.shared.delete(self._shared_key('lease', key))
+            except Exception:
+                self._count('backend_errors')
+
+    def _wait_for(self, key: str):
+        '''Значение, загруженное держателем аренды, или None, если он не успел за CACHE_LEASE_WAIT'''
+        deadline = time.monotonic() + LEASE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LEASE_POLL)
+            try:
+                _, entry = self._lookup(key)
+            except Exception:
+                self._count('backend_errors')
+                return None
+            if entry is not None and entry[1]:
+                return entry[0]
+        return None
+
+    def _revalidate(self, key: str, value, loader, generation, invalidations: int):
+        '''
+        Пересчёт устаревшей записи в этом же вызове: держатель аренды ждёт loader() и получает свежее значение,
+        остальные запросы сразу получают устаревшее. Фоновый поток не подходит: контейнер облачной функции
+        замораживается после ответа, и пересчёт мог бы не закончиться, удерживая аренду до LEASE_TTL
+        '''
+        if not self._acquire_lease(key):
+            return value
+        try:
+            fresh = loader()
+            if fresh is not None:
+                self._store(key, fresh, generation, invalidations)
+                value = fresh
+            self._count('refreshes')
+        except Exception:
+            # Ошибка пересчёта не ломает ответ: пока окно stale не истекло, отдаётся прежнее значение
+            self._count('refresh_errors')
+        finally:
+            self._release_lease(key)
+        return value
+
+    def get_or_load(self, key, loader):
+        '''Значение из кеша или loader(); None из loader не кешируется'''
+        if not ENABLED:
+            self._count('misses')
+            return loader()
+        key = str(key)
+        # Без общего бэкенда поколения нет: сброс удаляет запись, а счётчик сбросов ловит гонку с загрузкой
+        with self._lock:
+            invalidations = self._counters['invalidations']
+        try:
+            generation, entry = self._lookup(key)
+        except Exception:
+            self._count('backend_errors')
+            self._count('misses')
+            return loader()
+
+        if entry is not None:
+            value, fresh = entry
+            if fresh:
+                self._count('hits')
+            else:
+                self._count('stale_hits')
+                value = self._revalidate(key, value, loader, generation, invalidations)
+            return value
+
+        self._count('misses')
+        if not self.stale:
+            value = loader()
+            if value is not None:
+                self._store(key, value, generation, invalidations)
+            return value
+
+        leased = self._acquire_lease(key)
+        if not leased:
+            value = self._wait_for(key)
+            if value is not None:
+                self._count('coalesced')
+                return value
+        try:
+            value = loader()
+            if value is not None:
+                self._store(key, value, generation, invalidations)
+            return value
+        finally:
+            if leased:
+                self._release_lease(key)
+
+    def invalidate(self, *keys):
+        '''Сбрасывает ключи здесь и, если настроен общий бэкенд, во всех контейнерах'''
+        for key in keys:
+            key = str(key)
+            with self._lock:
+                self._entries.pop(key, None)
+                self._counters['invalidations'] += 1
+            if self.shared:
+                try:
+                    self.shared.incr(self._shared_key('gen', key))
+                except Exception:
+                    self._count('backend_errors')
+
+    def purge(self):
+        '''Сбрасывает все ключи кеша: с общим бэкендом — сменой общего поколения'''
+        with self._lock:
+            self._entries.clear()
+            self._counters['invalidations'] += 1
+            self._counters['purges'] += 1
+        if self.shared:
+            try:
+                self.shared.incr(self._shared_key('gen', '*'))
+            except Exception:
+                self._count('backend_errors')
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        served = counters['hits'] + counters['stale_hits'] + counters['coalesced']
+        lookups = counters['hits'] + counters['stale_hits'] + counters['misses']
+        return {
+            **counters,
+            'hit_rate': round(served / lookups, 3) if lookups else 0.0,
+            'size': size,
+            'max_entries': self.max_entries,
+            'ttl_s': self.ttl,
+            'stale_s': self.stale,
+            'backend': self.shared.__class__.__name__ if self.shared else 'memory',
+        }
+
+
+_caches = {}
+
+
+def stats() -> dict:
+    '''Счётчики всех кешей контейнера для ?action=metrics'''
+    return {name: c.stats() for name, c in _caches.items()}
+
+
+telemetry.register_stats('cache', stats)
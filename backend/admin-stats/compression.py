@@ -0,0 +1,101 @@
+'''
+Сжатие JSON-ответов по Accept-Encoding: brotli, если модуль brotli установлен, иначе gzip.
+Тело больше COMPRESS_MIN_BYTES отдаётся сжатым в base64 с isBase64Encoded=True.
+'''
+import base64
+import functools
+import gzip
+import os
+
+MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', '5'))
+
+_brotli = None
+
+
+def _brotli_module():
+    '''brotli загружается при первом сжатии; без него остаётся gzip'''
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli
+
+
+def accepted_encodings(event: dict) -> dict:
+    '''Accept-Encoding как {кодировка: q}; кодировки с q=0 исключены'''
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'accept-encoding'), '') or ''
+    result = {}
+    for part in value.split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            result[name.strip().lower()] = q
+    return result
+
+
+def choose_encoding(event: dict):
+    accepted = accepted_encodings(event)
+    candidates = ['br', 'gzip'] if _brotli_module() else ['gzip']
+    best = None
+    for name in candidates:
+        q = accepted.get(name, accepted.get('*', 0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (name, q)
+    return best[0] if best else None
+
+
+def compress(event: dict, response: dict) -> dict:
+    '''Сжимает тело ответа, если клиент это принимает и тело не меньше порога'''
+    if not isinstance(response, dict) or response.get('isBase64Encoded'):
+        return response
+    body = response.get('body')
+    if not isinstance(body, str) or not body:
+        return response
+    raw = body.encode('utf-8')
+    if len(raw) < MIN_BYTES:
+        return response
+
+    headers = dict(response.get('headers') or {})
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = choose_encoding(event)
+    if encoding == 'br':
+        data = _brotli.compress(raw, quality=BROTLI_QUALITY)
+    elif encoding == 'gzip':
+        data = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        return {**response, 'headers': headers}
+
+    headers['Content-Encoding'] = encoding
+    if headers.get('ETag', '').startswith('"'):
+        # Сжатое представление побайтно отличается от исходного: ETag становится слабым
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {
+        **response,
+        'headers': headers,
+        'body': base64.b64encode(data).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+
+def negotiate(handler):
+    '''Оборачивает handler облачной функции: ответы сжимаются по Accept-Encoding запроса'''
+
+    @functools.wraps(handler)
+    def wrapper(event: dict, context) -> dict:
+        return compress(event, handler(event, context))
+
+    return wrapper
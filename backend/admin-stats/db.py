@@ -0,0 +1,157 @@
+'''
+Пул подключений к PostgreSQL, общий для всех вызовов функции в тёплом контейнере.
+Соединения переживают вызовы, проверяются перед повторным использованием,
+а их число на контейнер ограничено DB_POOL_MAX.
+psycopg2 импортируется при первом подключении: OPTIONS и ?action=metrics его не загружают.
+'''
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', '4'))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '600'))
+
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_MAX)
+_idle = []
+_born = {}
+_local = threading.local()
+_driver = None
+_cursor_factory = None
+
+
+class PoolExhausted(Exception):
+    '''Все соединения контейнера заняты дольше DB_POOL_TIMEOUT'''
+
+
+def _psycopg2():
+    '''Драйвер PostgreSQL, загружаемый по первому требованию'''
+    global _driver, _cursor_factory
+    if _driver is None:
+        import psycopg2
+        import psycopg2.extensions
+
+        class _CountingCursor(psycopg2.extensions.cursor):
+            '''Курсор, считающий SQL-запросы и время их выполнения в текущем потоке'''
+
+            def execute(self, query, vars=None):
+                started = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    _count_query(time.perf_counter() - started)
+
+            def executemany(self, query, vars_list):
+                started = time.perf_counter()
+                try:
+                    return super().executemany(query, vars_list)
+                finally:
+                    _count_query(time.perf_counter() - started)
+
+            def copy_expert(self, sql, file, size=8192):
+                started = time.perf_counter()
+                try:
+                    return super().copy_expert(sql, file, size)
+                finally:
+                    _count_query(time.perf_counter() - started)
+
+        _cursor_factory = _CountingCursor
+        _driver = psycopg2
+    return _driver
+
+
+def _count_query(elapsed: float):
+    _local.queries = getattr(_local, 'queries', 0) + 1
+    _local.seconds = getattr(_local, 'seconds', 0.0) + elapsed
+
+
+def query_stats() -> tuple:
+    '''Число SQL-запросов и суммарное время (сек) в текущем потоке с момента старта'''
+    return getattr(_local, 'queries', 0), getattr(_local, 'seconds', 0.0)
+
+
+def _connect():
+    psycopg2 = _psycopg2()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=_cursor_factory)
+    _born[id(conn)] = time.monotonic()
+    return conn
+
+
+def _discard(conn):
+    _born.pop(id(conn), None)
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_usable(conn, idle_since: float) -> bool:
+    '''Проверка соединения перед выдачей: закрытые, старые и долго простаивавшие отбраковываются'''
+    if conn.closed:
+        return False
+    now = time.monotonic()
+    if now - _born.get(id(conn), now) > MAX_LIFETIME:
+        return False
+    if now - idle_since < HEALTHCHECK_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except _driver.Error:
+        return False
+
+
+def acquire():
+    '''Выдаёт соединение из пула, при необходимости открывая новое'''
+    if not _slots.acquire(timeout=POOL_TIMEOUT):
+        raise PoolExhausted(f'No free database connections (DB_POOL_MAX={POOL_MAX})')
+    try:
+        while True:
+            with _lock:
+                item = _idle.pop() if _idle else None
+            if item is None:
+                return _connect()
+            conn, idle_since = item
+            if _is_usable(conn, idle_since):
+                return conn
+            _discard(conn)
+    except BaseException:
+        _slots.release()
+        raise
+
+
+def release(conn, discard: bool = False):
+    '''Возвращает соединение в пул; незавершённая транзакция откатывается'''
+    try:
+        if discard or conn.closed:
+            _discard(conn)
+            return
+        try:
+            if conn.status != _driver.extensions.STATUS_READY:
+                conn.rollback()
+        except _driver.Error:
+            _discard(conn)
+            return
+        with _lock:
+            _idle.append((conn, time.monotonic()))
+    finally:
+        _slots.release()
+
+
+@contextmanager
+def connection():
+    '''Соединение из пула на время блока with'''
+    conn = acquire()
+    broken = False
+    try:
+        yield conn
+    except (_driver.OperationalError, _driver.InterfaceError):
+        broken = True
+        raise
+    finally:
+        release(conn, discard=broken)
@@ -1,36 +1,464 @@
+import base64
+import csv
+import io
 import json
 import os
-import psycopg2
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
 
-def handler(event: dict, context) -> dict:
-    '''API для получения статистики и данных администратора'''
+import cache
+import compression
+import db
+import encoder
+import storage
+import telemetry
+
+# summary — счётчики из admin_stats_summary (одна маленькая таблица, поддерживается триггерами),
+# exact — точный пересчёт по таблицам одним запросом; ?source= переопределяет на запрос
+STATS_SOURCE = os.environ.get('ADMIN_STATS_SOURCE', 'summary')
+
+# Все показатели одним запросом: каждая таблица читается один раз, счётчики считаются через FILTER
+STATS_EXACT_SQL = """
+    SELECT u.total AS "users.total",
+           u.customers AS "users.customers",
+           u.contractors AS "users.contractors",
+           p.total AS "projects.total",
+           p.active AS "projects.active",
+           p.completed AS "projects.completed",
+           p.by_type AS "projects.by_type",
+           COALESCE(p.avg_budget, 0)::float AS "projects.avg_budget",
+           (SELECT COUNT(*) FROM room_measurements) AS "content.measurements",
+           (SELECT COUNT(*) FROM project_photos) AS "content.photos"
+    FROM (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE user_type = 'customer') AS customers,
+               COUNT(*) FILTER (WHERE user_type = 'contractor') AS contractors
+        FROM users
+    ) u, (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'in_progress') AS active,
+               COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+               AVG(budget) AS avg_budget,
+               jsonb_strip_nulls(jsonb_build_object(
+                   'apartment', NULLIF(COUNT(*) FILTER (WHERE project_type = 'apartment'), 0),
+                   'house', NULLIF(COUNT(*) FILTER (WHERE project_type = 'house'), 0),
+                   'office', NULLIF(COUNT(*) FILTER (WHERE project_type = 'office'), 0),
+                   'commercial', NULLIF(COUNT(*) FILTER (WHERE project_type = 'commercial'), 0)
+               )) AS by_type
+        FROM projects
+    ) p
+"""
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# exact — COUNT(*) с теми же фильтрами, estimate — оценка строк планировщиком (EXPLAIN), none — без total
+TOTAL_MODES = ('exact', 'estimate', 'none')
+
+# Кеш ответов по действию: (TTL, окно stale-while-revalidate) в секундах.
+# Ключ — действие и параметры запроса; refresh=1 пересчитывает, DELETE ?action=cache сбрасывает
+RESPONSE_CACHE_TTL = {
+    'stats': (30, 600),
+    'timeseries': (300, 3600),
+    'projects': (15, 120),
+    'users': (30, 300),
+}
+RESPONSE_CACHE_ENABLED = os.environ.get('ADMIN_STATS_CACHE', '1') != '0'
+
+response_caches = {
+    action: cache.Cache(f'admin-stats:{action}', ttl=ttl, stale=stale)
+    for action, (ttl, stale) in RESPONSE_CACHE_TTL.items()
+}
+
+def encode_cursor(created_at: str, project_id: int) -> str:
+    '''Курсор страницы: позиция последнего проекта в порядке (created_at, id) DESC'''
+    raw = json.dumps([created_at, project_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(value: str) -> tuple:
+    raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+    created_at, project_id = json.loads(raw)
+    return datetime.fromisoformat(created_at), int(project_id)
+
+# Выгрузки action=export: строки идут серверным курсором пачками по EXPORT_BATCH_SIZE,
+# файл до EXPORT_INLINE_MAX_BYTES отдаётся в ответе, больший — кладётся в хранилище и отдаётся ссылкой
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '2000'))
+EXPORT_INLINE_MAX_BYTES = int(os.environ.get('EXPORT_INLINE_MAX_BYTES', str(1024 * 1024)))
+EXPORT_LINK_TTL = int(os.environ.get('EXPORT_LINK_TTL', '3600'))
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+# Запрос выгрузки и фильтры: параметр запроса -> колонка
+EXPORTS = {
+    'users': (
+        "SELECT id, phone, name, email, user_type, specialization, experience, is_verified, created_at FROM users",
+        {'user_type': 'user_type'}
+    ),
+    'projects': (
+        """SELECT p.id, p.title, p.address, p.project_type, p.area, p.rooms, p.budget, p.status, p.progress,
+                  p.start_date, p.deadline, p.created_at,
+                  u.id AS "customer.id", u.name AS "customer.name", u.phone AS "customer.phone", u.email AS "customer.email"
+           FROM projects p
+           JOIN users u ON p.user_id = u.id""",
+        {'status': 'p.status', 'project_type': 'p.project_type'}
+    ),
+}
+
+def write_export(conn, entity: str, params: dict, export_format: str, out) -> int:
+    '''Пишет выгрузку в out (текстовый файл) пачками из именованного курсора; возвращает число строк'''
+    query, filters = EXPORTS[entity]
+    conditions = []
+    values = []
+    for param, column in filters.items():
+        if params.get(param):
+            conditions.append(f"{column} = %s")
+            values.append(params[param])
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {'p.id' if entity == 'projects' else 'id'}"
     
-    method = event.get('httpMethod', 'GET')
+    count = 0
+    with conn.cursor(name=f'export_{entity}') as cursor:
+        cursor.execute(query, values)
+        writer = None
+        while True:
+            batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            if export_format == 'csv':
+                if writer is None:
+                    writer = csv.writer(out)
+                    writer.writerow([column.name for column in cursor.description])
+                writer.writerows(
+                    [value.isoformat() if isinstance(value, (date, datetime)) else value for value in row]
+                    for row in batch
+                )
+            else:
+                encode = encoder.row_encoder(cursor.description)
+                out.writelines(json.dumps(encode(row), ensure_ascii=False) + '\n' for row in batch)
+            count += len(batch)
+    return count
+
+def export_response(conn, params: dict) -> dict:
+    '''GET ?action=export&entity=users|projects&format=ndjson|csv'''
+    entity = params.get('entity', 'users')
+    export_format = params.get('format', 'ndjson')
+    if entity not in EXPORTS or export_format not in EXPORT_FORMATS:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f"entity must be one of: {', '.join(EXPORTS)}; format one of: {', '.join(EXPORT_FORMATS)}"}, ensure_ascii=False)
+        }
     
-    if method == 'OPTIONS':
+    content_type = EXPORT_FORMATS[export_format]
+    # Файл в памяти до порога, дальше — на диске: память не растёт с размером таблицы
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_INLINE_MAX_BYTES) as spool:
+        text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+        rows = write_export(conn, entity, params, export_format, text)
+        text.flush()
+        text.detach()
+        size = spool.tell()
+        
+        if size <= EXPORT_INLINE_MAX_BYTES:
+            spool.seek(0)
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': f'{content_type}; charset=utf-8',
+                    'Content-Disposition': f'attachment; filename="{entity}.{export_format}"',
+                    'X-Export-Rows': str(rows),
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'Content-Disposition, X-Export-Rows'
+                },
+                'body': spool.read().decode('utf-8')
+            }
+        
+        key = f"exports/{entity}/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{export_format}"
+        storage.put_file(key, spool, content_type)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'url': storage.signed_url(key, EXPORT_LINK_TTL),
+            'key': key,
+            'format': export_format,
+            'rows': rows,
+            'bytes': size,
+            'expires_in': EXPORT_LINK_TTL
+        }, ensure_ascii=False)
+    }
+
+# Метрики action=timeseries (таблица stats_daily, пересчёт stats_rollup() в V0009)
+TIMESERIES_METRICS = ('users.new', 'projects.new', 'projects.status_transitions', 'measurements.new', 'photos.new', 'work_orders.new')
+TIMESERIES_DEFAULT_DAYS = 30
+TIMESERIES_MAX_DAYS = 731
+# POST ?action=rollup не пересчитывает агрегаты, обновлённые не раньше стольких секунд назад (force=1 — всегда)
+ROLLUP_MAX_AGE = int(os.environ.get('STATS_ROLLUP_MAX_AGE', '300'))
+
+# Ряд по дням без пропусков: дни без строк в stats_daily дают 0
+TIMESERIES_SQL = """
+    SELECT d::date AS day,
+           COALESCE(SUM(r.value), 0)::bigint AS total,
+           COALESCE(jsonb_object_agg(r.dimension, r.value) FILTER (WHERE r.dimension <> ''), '{}'::jsonb) AS by_dimension
+    FROM generate_series(%(from)s::date, %(to)s::date, interval '1 day') AS d
+    LEFT JOIN stats_daily r ON r.metric = %(metric)s AND r.day = d::date
+    GROUP BY d
+    ORDER BY d
+"""
+
+def timeseries_response(cursor, params: dict) -> dict:
+    '''GET ?action=timeseries&metric=users.new&from=2025-01-01&to=2025-01-31 — только из дневных агрегатов'''
+    metric = params.get('metric')
+    if metric not in TIMESERIES_METRICS:
         return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Admin-Token'
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f"metric must be one of: {', '.join(TIMESERIES_METRICS)}"}, ensure_ascii=False)
+        }
+    try:
+        day_to = date.fromisoformat(params['to']) if params.get('to') else date.today()
+        day_from = date.fromisoformat(params['from']) if params.get('from') else day_to - timedelta(days=TIMESERIES_DEFAULT_DAYS - 1)
+    except ValueError:
+        day_to = day_from = None
+    if day_to is None or day_from > day_to or (day_to - day_from).days >= TIMESERIES_MAX_DAYS:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'from and to must be dates (YYYY-MM-DD), at most {TIMESERIES_MAX_DAYS} days apart'}, ensure_ascii=False)
+        }
+    
+    cursor.execute(TIMESERIES_SQL, {'from': day_from, 'to': day_to, 'metric': metric})
+    series = encoder.rows(cursor)
+    # Момент последнего пересчёта метрики: агрегаты догоняет POST ?action=rollup, а не этот запрос
+    cursor.execute("SELECT updated_at FROM stats_rollup_state WHERE metric = %s", (metric,))
+    rolled_up_at = cursor.fetchone()
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'metric': metric,
+            'from': day_from.isoformat(),
+            'to': day_to.isoformat(),
+            'series': series,
+            'rolled_up_at': rolled_up_at[0].isoformat() if rolled_up_at else None
+        }, ensure_ascii=False)
+    }
+
+def rollup_response(conn, cursor, params: dict) -> dict:
+    '''POST ?action=rollup[&force=1] — догоняет дневные агрегаты от водяного знака (stats_rollup() из V0009)'''
+    max_age = 0 if params.get('force') == '1' else ROLLUP_MAX_AGE
+    cursor.execute("SELECT stats_rollup(%s * interval '1 second')", (max_age,))
+    written = cursor.fetchone()[0]
+    conn.commit()
+    response_caches['timeseries'].purge()
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True, 'written': written}, ensure_ascii=False)
+    }
+
+def recount_response(conn, cursor) -> dict:
+    '''POST ?action=recount — точный пересчёт сводки admin_stats_summary (admin_stats_recount() из V0007)'''
+    cursor.execute("SELECT admin_stats_recount()")
+    conn.commit()
+    response_caches['stats'].purge()
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True}, ensure_ascii=False)
+    }
+
+SEARCH_TYPES = ('users', 'projects', 'work_orders')
+SEARCH_MIN_LENGTH = 3
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# Бюджет времени на весь поиск: каждый запрос получает statement_timeout из остатка
+SEARCH_BUDGET_MS = int(os.environ.get('ADMIN_SEARCH_BUDGET_MS', '1500'))
+
+# Условия совпадают с индексами V0010: триграммы для ILIKE/LIKE, выражения to_tsvector('russian', ...) для @@.
+# rank — лучшая из оценок: word_similarity фрагмента, совпадение телефона, ts_rank по словам
+SEARCH_SQL = {
+    'users': """
+        SELECT 'user' AS type, id, name AS title, concat_ws(', ', phone, email) AS subtitle, created_at,
+               GREATEST(word_similarity(%(q)s, name),
+                        word_similarity(%(q)s, COALESCE(email, '')),
+                        CASE WHEN regexp_replace(phone, '[^0-9]', '', 'g') LIKE %(digits)s THEN 1 ELSE 0 END,
+                        ts_rank(to_tsvector('russian', name), plainto_tsquery('russian', %(q)s)))::float AS rank
+        FROM users
+        WHERE name ILIKE %(pattern)s
+           OR email ILIKE %(pattern)s
+           OR regexp_replace(phone, '[^0-9]', '', 'g') LIKE %(digits)s
+           OR to_tsvector('russian', name) @@ plainto_tsquery('russian', %(q)s)
+        ORDER BY rank DESC, id DESC
+        LIMIT %(limit)s
+    """,
+    'projects': """
+        SELECT 'project' AS type, id, title, address AS subtitle, created_at,
+               GREATEST(word_similarity(%(q)s, title),
+                        word_similarity(%(q)s, address),
+                        ts_rank(to_tsvector('russian', title || ' ' || address), plainto_tsquery('russian', %(q)s)))::float AS rank
+        FROM projects
+        WHERE title ILIKE %(pattern)s
+           OR address ILIKE %(pattern)s
+           OR to_tsvector('russian', title || ' ' || address) @@ plainto_tsquery('russian', %(q)s)
+        ORDER BY rank DESC, id DESC
+        LIMIT %(limit)s
+    """,
+    'work_orders': """
+        SELECT 'work_order' AS type, id, left(work_description, 200) AS title,
+               concat_ws(', ', customer_phone, status) AS subtitle, created_at,
+               GREATEST(word_similarity(%(q)s, work_description),
+                        ts_rank(to_tsvector('russian', work_description), plainto_tsquery('russian', %(q)s)))::float AS rank
+        FROM work_orders
+        WHERE work_description ILIKE %(pattern)s
+           OR to_tsvector('russian', work_description) @@ plainto_tsquery('russian', %(q)s)
+        ORDER BY rank DESC, id DESC
+        LIMIT %(limit)s
+    """,
+}
+
+def like_pattern(text: str) -> str:
+    '''Подстрока для LIKE: символы шаблона % и _ экранируются'''
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def search_response(conn, cursor, params: dict) -> dict:
+    '''GET ?action=search&q=...&types=users,projects,work_orders&limit=20 — результаты по убыванию rank'''
+    q = ' '.join((params.get('q') or '').split())
+    types = [t for t in (params.get('types') or ','.join(SEARCH_TYPES)).split(',') if t]
+    try:
+        limit = min(max(int(params.get('limit', SEARCH_DEFAULT_LIMIT)), 1), SEARCH_MAX_LIMIT)
+    except ValueError:
+        limit = None
+    if len(q) < SEARCH_MIN_LENGTH or limit is None or not types or any(t not in SEARCH_TYPES for t in types):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f"q must have at least {SEARCH_MIN_LENGTH} characters, types must be from: {', '.join(SEARCH_TYPES)}"}, ensure_ascii=False)
+        }
+    
+    digits = ''.join(c for c in q if c.isdigit())
+    values = {
+        'q': q,
+        'pattern': like_pattern(q),
+        # Телефон ищется по цифрам запроса среди цифр номера (индекс из V0016), если их достаточно для триграмм
+        'digits': like_pattern(digits) if len(digits) >= SEARCH_MIN_LENGTH else None,
+        'limit': limit
+    }
+    
+    started = time.perf_counter()
+    results = []
+    timed_out = []
+    for entity in types:
+        remaining_ms = SEARCH_BUDGET_MS - (time.perf_counter() - started) * 1000
+        if remaining_ms < 1:
+            timed_out.append(entity)
+            continue
+        try:
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", (str(int(remaining_ms)),))
+            cursor.execute(SEARCH_SQL[entity], values)
+            results.extend(encoder.rows(cursor))
+        except Exception as e:
+            # 57014 query_canceled: запрос не уложился в бюджет, остальные типы всё равно ищутся
+            if getattr(e, 'pgcode', None) != '57014':
+                raise
+            conn.rollback()
+            timed_out.append(entity)
+    conn.rollback()
+    
+    results.sort(key=lambda r: r['rank'], reverse=True)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'q': q,
+            'results': results[:limit],
+            'timed_out': timed_out,
+            'took_ms': round((time.perf_counter() - started) * 1000, 1)
+        }, ensure_ascii=False)
+    }
+
+def stats_from_summary(metrics: dict):
+    '''Ответ action=stats из строк admin_stats_summary; None, если таблица ещё не заполнена'''
+    if not metrics:
+        return None
+    
+    def count(name: str) -> int:
+        return int(metrics.get(name, 0))
+    
+    budget_count = count('projects.budget_count')
+    return {
+        'users': {
+            'total': count('users.total'),
+            'customers': count('users.customer'),
+            'contractors': count('users.contractor')
+        },
+        'projects': {
+            'total': count('projects.total'),
+            'active': count('projects.status.in_progress'),
+            'completed': count('projects.status.completed'),
+            'by_type': {
+                name[len('projects.type.'):]: int(value)
+                for name, value in metrics.items()
+                if name.startswith('projects.type.') and value > 0
             },
-            'body': ''
+            'avg_budget': float(metrics['projects.budget_sum']) / budget_count if budget_count else 0
+        },
+        'content': {
+            'measurements': count('content.measurements'),
+            'photos': count('content.photos')
         }
+    }
+
+def cache_key(params: dict) -> str:
+    '''Ключ ответа: параметры запроса в стабильном порядке, без action и refresh'''
+    return json.dumps(sorted((k, v) for k, v in params.items() if k not in ('action', 'refresh')), ensure_ascii=False)
+
+def cached_response(event: dict, action: str, params: dict) -> dict:
+    '''GET-ответ через кеш действия: кешируются только ответы 200'''
+    response_cache = response_caches[action]
+    key = cache_key(params)
+    if params.get('refresh') == '1':
+        response_cache.invalidate(key)
+    fetched = {}
     
-    # Проверка админского токена (пока простая проверка)
-    admin_token = event.get('headers', {}).get('X-Admin-Token', '')
-    admin_password = os.environ.get('ADMIN_PASSWORD', 'admin2025')
+    def load():
+        fetched['response'] = respond(event)
+        return fetched['response'] if fetched['response']['statusCode'] == 200 else None
     
-    if admin_token != admin_password:
+    return response_cache.get_or_load(key, load) or fetched.get('response')
+
+def cache_response(method: str, params: dict) -> dict:
+    '''GET ?action=cache — счётчики кеша ответов, DELETE ?action=cache[&target=stats] — сброс'''
+    target = params.get('target')
+    if target and target not in response_caches:
         return {
-            'statusCode': 401,
+            'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Unauthorized'})
+            'body': json.dumps({'error': f"target must be one of: {', '.join(response_caches)}"}, ensure_ascii=False)
         }
+    targets = [target] if target else list(response_caches)
+    
+    if method == 'DELETE':
+        for name in targets:
+            response_caches[name].purge()
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'purged': targets if method == 'DELETE' else [],
+            'cache': {name: response_caches[name].stats() for name in targets}
+        }, ensure_ascii=False)
+    }
+
+def respond(event: dict) -> dict:
+    '''Ответ на запрос к БД без кеша; вызывается и из фонового пересчёта кеша'''
+    method = event.get('httpMethod', 'GET')
+    conn = db.acquire()
     cursor = conn.cursor()
     
     try:
@@ -38,132 +466,131 @@ def handler(event: dict, context) -> dict:
             action = event.get('queryStringParameters', {}).get('action', 'stats')
             
             if action == 'stats':
-                # Общая статистика
-                cursor.execute("SELECT COUNT(*) FROM users")
-                total_users = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM users WHERE user_type = 'customer'")
-                customers_count = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM users WHERE user_type = 'contractor'")
-                contractors_count = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM projects")
-                total_projects = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM projects WHERE status = 'in_progress'")
-                active_projects = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM projects WHERE status = 'completed'")
-                completed_projects = cursor.fetchone()[0]
+                params = event.get('queryStringParameters') or {}
+                source = params.get('source', STATS_SOURCE)
                 
-                cursor.execute("SELECT COUNT(*) FROM room_measurements")
-                total_measurements = cursor.fetchone()[0]
+                stats = None
+                if source == 'summary':
+                    cursor.execute("SELECT metric, value FROM admin_stats_summary")
+                    stats = stats_from_summary(dict(cursor.fetchall()))
                 
-                cursor.execute("SELECT COUNT(*) FROM project_photos")
-                total_photos = cursor.fetchone()[0]
-                
-                # Статистика по типам проектов
-                cursor.execute("""
-                    SELECT project_type, COUNT(*) 
-                    FROM projects 
-                    GROUP BY project_type
-                """)
-                project_types = dict(cursor.fetchall())
-                
-                # Средний бюджет
-                cursor.execute("SELECT AVG(budget) FROM projects WHERE budget IS NOT NULL")
-                avg_budget = cursor.fetchone()[0]
+                if stats is None:
+                    source = 'exact'
+                    cursor.execute(STATS_EXACT_SQL)
+                    stats = encoder.row(cursor)
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({
-                        'stats': {
-                            'users': {
-                                'total': total_users,
-                                'customers': customers_count,
-                                'contractors': contractors_count
-                            },
-                            'projects': {
-                                'total': total_projects,
-                                'active': active_projects,
-                                'completed': completed_projects,
-                                'by_type': project_types,
-                                'avg_budget': float(avg_budget) if avg_budget else 0
-                            },
-                            'content': {
-                                'measurements': total_measurements,
-                                'photos': total_photos
-                            }
-                        }
-                    })
+                        'stats': stats,
+                        'source': source
+                    }, ensure_ascii=False)
                 }
             
             elif action == 'projects':
-                # Список всех проектов с информацией о пользователях
-                limit = int(event.get('queryStringParameters', {}).get('limit', '50'))
-                offset = int(event.get('queryStringParameters', {}).get('offset', '0'))
-                status_filter = event.get('queryStringParameters', {}).get('status')
+                # Список всех проектов с информацией о пользователях, страницы по курсору (created_at, id)
+                params = event.get('queryStringParameters') or {}
+                
+                try:
+                    limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                    after = decode_cursor(params['cursor']) if params.get('cursor') else None
+                    date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else None
+                    date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else None
+                except (ValueError, TypeError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid limit, cursor or date range'}, ensure_ascii=False)
+                    }
+                
+                total_mode = params.get('total', 'estimate')
+                if total_mode not in TOTAL_MODES:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f"total must be one of: {', '.join(TOTAL_MODES)}"}, ensure_ascii=False)
+                    }
+                
+                conditions = []
+                values = []
+                if params.get('status'):
+                    conditions.append("p.status = %s")
+                    values.append(params['status'])
+                if params.get('project_type'):
+                    conditions.append("p.project_type = %s")
+                    values.append(params['project_type'])
+                if date_from:
+                    conditions.append("p.created_at >= %s")
+                    values.append(date_from)
+                if date_to:
+                    # date_to включительно: до начала следующего дня
+                    conditions.append("p.created_at < %s::date + 1")
+                    values.append(date_to)
+                
+                page_conditions = list(conditions)
+                page_values = list(values)
+                if after:
+                    page_conditions.append("(p.created_at, p.id) < (%s, %s)")
+                    page_values.extend(after)
                 
                 query = """
                     SELECT 
                         p.id, p.title, p.address, p.project_type, p.area, 
                         p.rooms, p.budget, p.status, p.progress, p.created_at,
-                        u.name as customer_name, u.phone as customer_phone, u.email as customer_email
+                        u.name AS "customer.name", u.phone AS "customer.phone", u.email AS "customer.email"
                     FROM projects p
                     JOIN users u ON p.user_id = u.id
                 """
-                params = []
+                if page_conditions:
+                    query += " WHERE " + " AND ".join(page_conditions)
+                query += " ORDER BY p.created_at DESC, p.id DESC LIMIT %s"
+                page_values.append(limit + 1)
                 
-                if status_filter:
-                    query += " WHERE p.status = %s"
-                    params.append(status_filter)
+                cursor.execute(query, page_values)
+                projects = encoder.rows(cursor)
                 
-                query += " ORDER BY p.created_at DESC LIMIT %s OFFSET %s"
-                params.extend([limit, offset])
+                next_cursor = None
+                if len(projects) > limit:
+                    projects = projects[:limit]
+                    next_cursor = encode_cursor(projects[-1]['created_at'], projects[-1]['id'])
                 
-                cursor.execute(query, params)
-                projects = cursor.fetchall()
-                
-                # Подсчёт общего количества
-                count_query = "SELECT COUNT(*) FROM projects"
-                if status_filter:
-                    count_query += " WHERE status = %s"
-                    cursor.execute(count_query, [status_filter])
-                else:
-                    cursor.execute(count_query)
-                total_count = cursor.fetchone()[0]
+                # Общее количество: точный COUNT, оценка планировщика или ничего
+                total_count = None
+                filtered = "FROM projects p"
+                if conditions:
+                    filtered += " WHERE " + " AND ".join(conditions)
+                if total_mode == 'exact':
+                    cursor.execute(f"SELECT COUNT(*) {filtered}", values)
+                    total_count = cursor.fetchone()[0]
+                elif total_mode == 'estimate':
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 {filtered}", values)
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    total_count = int(plan[0]['Plan']['Plan Rows'])
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({
-                        'projects': [
-                            {
-                                'id': p[0],
-                                'title': p[1],
-                                'address': p[2],
-                                'project_type': p[3],
-                                'area': float(p[4]) if p[4] else None,
-                                'rooms': p[5],
-                                'budget': float(p[6]) if p[6] else None,
-                                'status': p[7],
-                                'progress': p[8],
-                                'created_at': p[9].isoformat() if p[9] else None,
-                                'customer': {
-                                    'name': p[10],
-                                    'phone': p[11],
-                                    'email': p[12]
-                                }
-                            } for p in projects
-                        ],
+                        'projects': projects,
+                        'next_cursor': next_cursor,
                         'total': total_count,
-                        'limit': limit,
-                        'offset': offset
-                    })
+                        'total_mode': total_mode,
+                        'limit': limit
+                    }, ensure_ascii=False)
                 }
             
+            elif action == 'timeseries':
+                return timeseries_response(cursor, event.get('queryStringParameters') or {})
+            
+            elif action == 'search':
+                return search_response(conn, cursor, event.get('queryStringParameters') or {})
+            
+            elif action == 'export':
+                return export_response(conn, event.get('queryStringParameters') or {})
+            
             elif action == 'users':
                 # Список всех пользователей
                 user_type = event.get('queryStringParameters', {}).get('user_type')
@@ -178,48 +605,82 @@ def handler(event: dict, context) -> dict:
                 query += " ORDER BY created_at DESC"
                 
                 cursor.execute(query, params)
-                users = cursor.fetchall()
+                users = encoder.rows(cursor)
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({
-                        'users': [
-                            {
-                                'id': u[0],
-                                'phone': u[1],
-                                'name': u[2],
-                                'email': u[3],
-                                'user_type': u[4],
-                                'specialization': u[5],
-                                'experience': u[6],
-                                'is_verified': u[7],
-                                'created_at': u[8].isoformat() if u[8] else None
-                            } for u in users
-                        ]
-                    })
+                        'users': users
+                    }, ensure_ascii=False)
                 }
             
             else:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Invalid action'})
+                    'body': json.dumps({'error': 'Invalid action'}, ensure_ascii=False)
                 }
         
+        elif method == 'POST' and (event.get('queryStringParameters') or {}).get('action') == 'rollup':
+            return rollup_response(conn, cursor, event.get('queryStringParameters') or {})
+        
+        elif method == 'POST' and (event.get('queryStringParameters') or {}).get('action') == 'recount':
+            return recount_response(conn, cursor)
+        
         else:
             return {
                 'statusCode': 405,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Method not allowed'})
+                'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
             }
     
     except Exception as e:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
         }
     finally:
         cursor.close()
-        conn.close()
+        db.release(conn)
+
+@telemetry.instrument
+@compression.negotiate
+def handler(event: dict, context) -> dict:
+    '''API для получения статистики и данных администратора'''
+    
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Admin-Token'
+            },
+            'body': ''
+        }
+    
+    # Проверка админского токена (пока простая проверка)
+    admin_token = event.get('headers', {}).get('X-Admin-Token', '')
+    admin_password = os.environ.get('ADMIN_PASSWORD', 'admin2025')
+    
+    if admin_token != admin_password:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unauthorized'}, ensure_ascii=False)
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    action = params.get('action', 'stats')
+    
+    if action == 'cache' and method in ('GET', 'DELETE'):
+        return cache_response(method, params)
+    
+    if method == 'GET' and RESPONSE_CACHE_ENABLED and action in response_caches:
+        return cached_response(event, action, params)
+    
+    return respond(event)
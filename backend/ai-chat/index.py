@@ -1,14 +1,11 @@
 import json
 import os
-import requests
-import psycopg2
 from typing import List, Dict
 import uuid
 
-def get_db_connection():
-    """Создает подключение к базе данных"""
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+import db
+import encoder
+import telemetry
 
 def save_chat_session(conn, session_id: str, user_id: int = None):
     """Сохраняет или обновляет сессию чата"""
@@ -45,21 +42,14 @@ def get_chat_history(conn, session_id: str) -> List[Dict]:
     """Загружает историю чата из базы данных"""
     with conn.cursor() as cur:
         cur.execute("""
-            SELECT role, content, created_at 
+            SELECT role, content, created_at AS timestamp 
             FROM t_p46588937_remont_plus_app.ai_chat_messages
             WHERE session_id = %s
             ORDER BY created_at ASC
         """, (session_id,))
-        rows = cur.fetchall()
-        return [
-            {
-                'role': row[0],
-                'content': row[1],
-                'timestamp': row[2].isoformat()
-            }
-            for row in rows
-        ]
+        return encoder.rows(cur)
 
+@telemetry.instrument
 def handler(event: dict, context) -> dict:
     """API для чата с ИИ-консультантом по ремонту с сохранением в БД"""
     method = event.get('httpMethod', 'GET')
@@ -83,7 +73,7 @@ def handler(event: dict, context) -> dict:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False),
             'isBase64Encoded': False
         }
     
@@ -94,7 +84,7 @@ def handler(event: dict, context) -> dict:
         session_id = body.get('sessionId')
         load_history = body.get('loadHistory', False)
         
-        conn = get_db_connection()
+        conn = db.acquire()
         
         if not session_id:
             session_id = str(uuid.uuid4())
@@ -112,7 +102,7 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({
                     'sessionId': session_id,
                     'messages': history
-                }),
+                }, ensure_ascii=False),
                 'isBase64Encoded': False
             }
         
@@ -123,7 +113,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'error': 'Messages array is required'}),
+                'body': json.dumps({'error': 'Messages array is required'}, ensure_ascii=False),
                 'isBase64Encoded': False
             }
         
@@ -135,7 +125,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'error': 'API key not configured'}),
+                'body': json.dumps({'error': 'API key not configured'}, ensure_ascii=False),
                 'isBase64Encoded': False
             }
         
@@ -167,22 +157,36 @@ def handler(event: dict, context) -> dict:
         
         full_messages = [system_prompt] + messages
         
-        response = requests.post(
-            'https://api.polza.ai/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'gpt-4o-mini',
-                'messages': full_messages,
-                'temperature': 0.7,
-                'max_tokens': 1500
-            },
-            timeout=30
-        )
+        import requests
+        
+        try:
+            with telemetry.external('polza'):
+                response = requests.post(
+                    'https://api.polza.ai/v1/chat/completions',
+                    headers={
+                        'Authorization': f'Bearer {api_key}',
+                        'Content-Type': 'application/json'
+                    },
+                    json={
+                        'model': 'gpt-4o-mini',
+                        'messages': full_messages,
+                        'temperature': 0.7,
+                        'max_tokens': 1500
+                    },
+                    timeout=30
+                )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            return {
+                'statusCode': 502,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': f'AI service error: {str(e)}'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
         
-        response.raise_for_status()
         data = response.json()
         
         assistant_message = data['choices'][0]['message']['content']
@@ -203,7 +207,7 @@ def handler(event: dict, context) -> dict:
                 'sessionId': session_id,
                 'message': assistant_message,
                 'usage': data.get('usage', {})
-            }),
+            }, ensure_ascii=False),
             'isBase64Encoded': False
         }
         
@@ -214,17 +218,7 @@ def handler(event: dict, context) -> dict:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': 'Invalid JSON in request body'}),
-            'isBase64Encoded': False
-        }
-    except requests.RequestException as e:
-        return {
-            'statusCode': 502,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': f'AI service error: {str(e)}'}),
+            'body': json.dumps({'error': 'Invalid JSON in request body'}, ensure_ascii=False),
             'isBase64Encoded': False
         }
     except Exception as e:
@@ -234,9 +228,9 @@ def handler(event: dict, context) -> dict:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': f'Internal error: {str(e)}'}),
+            'body': json.dumps({'error': f'Internal error: {str(e)}'}, ensure_ascii=False),
             'isBase64Encoded': False
         }
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            db.release(conn)
\ No newline at end of file
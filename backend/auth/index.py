@@ -1,9 +1,12 @@
 import json
-import os
-import psycopg2
 from datetime import datetime, timedelta
 import random
 
+import db
+import encoder
+import telemetry
+
+@telemetry.instrument
 def handler(event: dict, context) -> dict:
     '''API для регистрации и авторизации пользователей с SMS-подтверждением'''
     
@@ -24,14 +27,13 @@ def handler(event: dict, context) -> dict:
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
+            'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
         }
     
     body = json.loads(event.get('body', '{}'))
     action = body.get('action')
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = db.acquire()
     cursor = conn.cursor()
     
     try:
@@ -40,7 +42,7 @@ def handler(event: dict, context) -> dict:
             user_type = body.get('user_type', 'customer')
             
             if not phone:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Phone is required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Phone is required'}, ensure_ascii=False)}
             
             code = str(random.randint(1000, 9999))
             expires_at = datetime.now() + timedelta(minutes=10)
@@ -60,7 +62,7 @@ def handler(event: dict, context) -> dict:
                     'success': True,
                     'message': f'Код отправлен на {phone}',
                     'dev_code': code
-                })
+                }, ensure_ascii=False)
             }
         
         elif action == 'verify_code':
@@ -73,7 +75,7 @@ def handler(event: dict, context) -> dict:
             experience = body.get('experience')
             
             if not all([phone, code, name]):
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Phone, code and name are required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Phone, code and name are required'}, ensure_ascii=False)}
             
             cursor.execute(
                 "SELECT id FROM sms_codes WHERE phone = %s AND code = %s AND expires_at > NOW() AND is_used = FALSE ORDER BY created_at DESC LIMIT 1",
@@ -82,7 +84,7 @@ def handler(event: dict, context) -> dict:
             sms_record = cursor.fetchone()
             
             if not sms_record:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Invalid or expired code'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Invalid or expired code'}, ensure_ascii=False)}
             
             cursor.execute("UPDATE sms_codes SET is_used = TRUE WHERE id = %s", (sms_record[0],))
             
@@ -112,54 +114,44 @@ def handler(event: dict, context) -> dict:
                         'user_type': user[3],
                         'phone': phone
                     }
-                })
+                }, ensure_ascii=False)
             }
         
         elif action == 'get_user':
             phone = body.get('phone')
             
             if not phone:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Phone is required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Phone is required'}, ensure_ascii=False)}
             
             cursor.execute(
                 "SELECT id, phone, name, email, user_type, specialization, experience, is_verified, created_at FROM users WHERE phone = %s",
                 (phone,)
             )
-            user_data = cursor.fetchone()
+            user_data = encoder.row(cursor)
             
             if not user_data:
-                return {'statusCode': 404, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'User not found'})}
+                return {'statusCode': 404, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'User not found'}, ensure_ascii=False)}
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({
                     'success': True,
-                    'user': {
-                        'id': user_data[0],
-                        'phone': user_data[1],
-                        'name': user_data[2],
-                        'email': user_data[3],
-                        'user_type': user_data[4],
-                        'specialization': user_data[5],
-                        'experience': user_data[6],
-                        'is_verified': user_data[7],
-                        'created_at': user_data[8].isoformat() if user_data[8] else None
-                    }
-                })
+                    'user': user_data
+                }, ensure_ascii=False)
             }
         
         else:
-            return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Invalid action'})}
+            return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Invalid action'}, ensure_ascii=False)}
     
     except Exception as e:
         conn.rollback()
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
         }
     
     finally:
         cursor.close()
-        conn.close()
+        db.release(conn)
@@ -14,7 +14,7 @@ import os
 from dataclasses import dataclass
 from typing import Optional
 
-import requests
+import telemetry
 
 
 # =============================================================================
@@ -75,7 +75,9 @@ def get_api_key() -> str:
 
 
 def make_request(endpoint: str, method: str = "POST", data: Optional[dict] = None) -> dict:
-    """Make request to provider API."""
+    """Make request to provider API (requests is imported here to keep cold start light)."""
+    import requests
+
     api_key = get_api_key()
     url = f"{PROVIDER_BASE_URL}/{endpoint}"
 
@@ -85,10 +87,11 @@ def make_request(endpoint: str, method: str = "POST", data: Optional[dict] = Non
     }
 
     try:
-        if method == "GET":
-            response = requests.get(url, headers=headers, timeout=DEFAULT_TIMEOUT)
-        else:
-            response = requests.post(url, headers=headers, json=data, timeout=DEFAULT_TIMEOUT)
+        with telemetry.external("polza"):
+            if method == "GET":
+                response = requests.get(url, headers=headers, timeout=DEFAULT_TIMEOUT)
+            else:
+                response = requests.post(url, headers=headers, json=data, timeout=DEFAULT_TIMEOUT)
 
         response.raise_for_status()
         return response.json()
@@ -235,6 +238,7 @@ def handle_test(body: dict) -> dict:
 # MAIN HANDLER
 # =============================================================================
 
+@telemetry.instrument
 def handler(event: dict, context) -> dict:
     """Main entry point."""
     method = event.get("httpMethod", "POST")
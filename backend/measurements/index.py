@@ -1,8 +1,14 @@
 import json
-import os
-import psycopg2
-from decimal import Decimal
 
+import cache
+import db
+import encoder
+import telemetry
+
+# Кеш собранного проекта из функции projects: записи замеров его сбрасывают
+project_cache = cache.Cache('project')
+
+@telemetry.instrument
 def handler(event: dict, context) -> dict:
     '''API для управления измерениями помещений'''
     
@@ -19,8 +25,7 @@ def handler(event: dict, context) -> dict:
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = db.acquire()
     cursor = conn.cursor()
     
     try:
@@ -28,31 +33,20 @@ def handler(event: dict, context) -> dict:
             project_id = event.get('queryStringParameters', {}).get('project_id')
             
             if not project_id:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'project_id is required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'project_id is required'}, ensure_ascii=False)}
             
             cursor.execute(
                 "SELECT id, room_name, length, width, height, area, notes, created_at FROM room_measurements WHERE project_id = %s ORDER BY created_at ASC",
                 (project_id,)
             )
-            measurements = cursor.fetchall()
+            measurements = encoder.rows(cursor)
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({
-                    'measurements': [
-                        {
-                            'id': m[0],
-                            'room_name': m[1],
-                            'length': float(m[2]),
-                            'width': float(m[3]),
-                            'height': float(m[4]),
-                            'area': float(m[5]) if m[5] else None,
-                            'notes': m[6],
-                            'created_at': m[7].isoformat() if m[7] else None
-                        } for m in measurements
-                    ]
-                })
+                    'measurements': measurements
+                }, ensure_ascii=False)
             }
         
         elif method == 'POST':
@@ -66,7 +60,7 @@ def handler(event: dict, context) -> dict:
             notes = body.get('notes')
             
             if not all([project_id, room_name, length, width, height]):
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'project_id, room_name, length, width and height are required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'project_id, room_name, length, width and height are required'}, ensure_ascii=False)}
             
             area = float(length) * float(width)
             
@@ -76,6 +70,7 @@ def handler(event: dict, context) -> dict:
             )
             measurement_id = cursor.fetchone()[0]
             conn.commit()
+            project_cache.invalidate(project_id)
             
             return {
                 'statusCode': 201,
@@ -85,7 +80,7 @@ def handler(event: dict, context) -> dict:
                     'measurement_id': measurement_id,
                     'area': area,
                     'message': 'Measurement created successfully'
-                })
+                }, ensure_ascii=False)
             }
         
         elif method == 'PUT':
@@ -93,7 +88,7 @@ def handler(event: dict, context) -> dict:
             
             measurement_id = body.get('measurement_id')
             if not measurement_id:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'measurement_id is required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'measurement_id is required'}, ensure_ascii=False)}
             
             updates = []
             values = []
@@ -117,15 +112,18 @@ def handler(event: dict, context) -> dict:
                     values.append(new_area)
             
             if not updates:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'No fields to update'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'No fields to update'}, ensure_ascii=False)}
             
             values.append(measurement_id)
             
             cursor.execute(
-                f"UPDATE room_measurements SET {', '.join(updates)} WHERE id = %s",
+                f"UPDATE room_measurements SET {', '.join(updates)} WHERE id = %s RETURNING project_id",
                 values
             )
+            updated = cursor.fetchone()
             conn.commit()
+            if updated:
+                project_cache.invalidate(updated[0])
             
             return {
                 'statusCode': 200,
@@ -133,7 +131,7 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({
                     'success': True,
                     'message': 'Measurement updated successfully'
-                })
+                }, ensure_ascii=False)
             }
         
         elif method == 'DELETE':
@@ -141,13 +139,16 @@ def handler(event: dict, context) -> dict:
             measurement_id = body.get('measurement_id')
             
             if not measurement_id:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'measurement_id is required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'measurement_id is required'}, ensure_ascii=False)}
             
             cursor.execute(
-                "DELETE FROM room_measurements WHERE id = %s",
+                "DELETE FROM room_measurements WHERE id = %s RETURNING project_id",
                 (measurement_id,)
             )
+            deleted = cursor.fetchone()
             conn.commit()
+            if deleted:
+                project_cache.invalidate(deleted[0])
             
             return {
                 'statusCode': 200,
@@ -155,20 +156,20 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({
                     'success': True,
                     'message': 'Measurement deleted successfully'
-                })
+                }, ensure_ascii=False)
             }
         
         else:
-            return {'statusCode': 405, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Method not allowed'})}
+            return {'statusCode': 405, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)}
     
     except Exception as e:
         conn.rollback()
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
         }
     
     finally:
         cursor.close()
-        conn.close()
+        db.release(conn)
@@ -1,7 +1,9 @@
 import json
 import os
-import requests
 
+import telemetry
+
+@telemetry.instrument
 def handler(event: dict, context) -> dict:
     '''
     Отправка уведомлений о нарядах-заказах через SMS и Telegram
@@ -62,7 +64,7 @@ def send_notification(data: dict) -> dict:
             'body': json.dumps({
                 'success': True,
                 'results': results
-            })
+            }, ensure_ascii=False)
         }
     except Exception as e:
         return error_response(str(e), 500)
@@ -77,16 +79,19 @@ def send_sms(phone: str, message: str) -> dict:
     try:
         phone_clean = phone.replace('+', '').replace('-', '').replace(' ', '')
         
-        response = requests.post(
-            'https://sms.ru/sms/send',
-            data={
-                'api_id': api_key,
-                'to': phone_clean,
-                'msg': message,
-                'json': 1
-            },
-            timeout=10
-        )
+        import requests
+        
+        with telemetry.external('smsru'):
+            response = requests.post(
+                'https://sms.ru/sms/send',
+                data={
+                    'api_id': api_key,
+                    'to': phone_clean,
+                    'msg': message,
+                    'json': 1
+                },
+                timeout=10
+            )
         
         result = response.json()
         
@@ -105,15 +110,18 @@ def send_telegram(chat_id: str, message: str) -> dict:
         return {'success': False, 'error': 'Telegram bot token not configured'}
     
     try:
-        response = requests.post(
-            f'https://api.telegram.org/bot{bot_token}/sendMessage',
-            json={
-                'chat_id': chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            },
-            timeout=10
-        )
+        import requests
+        
+        with telemetry.external('telegram'):
+            response = requests.post(
+                f'https://api.telegram.org/bot{bot_token}/sendMessage',
+                json={
+                    'chat_id': chat_id,
+                    'text': message,
+                    'parse_mode': 'HTML'
+                },
+                timeout=10
+            )
         
         result = response.json()
         
@@ -161,7 +169,7 @@ def test_notification(data: dict) -> dict:
             'body': json.dumps({
                 'success': result.get('success', False),
                 'result': result
-            })
+            }, ensure_ascii=False)
         }
     except Exception as e:
         return error_response(str(e), 500)
@@ -171,5 +179,5 @@ def error_response(message: str, status_code: int = 500) -> dict:
     return {
         'statusCode': status_code,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'success': False, 'error': message})
+        'body': json.dumps({'success': False, 'error': message}, ensure_ascii=False)
     }
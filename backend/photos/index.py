@@ -1,10 +1,17 @@
 import json
-import os
-import boto3
-import psycopg2
 import base64
 from datetime import datetime
 
+import cache
+import db
+import encoder
+import storage
+import telemetry
+
+# Кеш собранного проекта из функции projects: загрузка и удаление фото его сбрасывают
+project_cache = cache.Cache('project')
+
+@telemetry.instrument
 def handler(event: dict, context) -> dict:
     '''API для загрузки и управления фотографиями проектов'''
     
@@ -21,8 +28,7 @@ def handler(event: dict, context) -> dict:
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = db.acquire()
     cursor = conn.cursor()
     
     try:
@@ -33,29 +39,21 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'project_id is required'})
+                    'body': json.dumps({'error': 'project_id is required'}, ensure_ascii=False)
                 }
             
             cursor.execute(
                 "SELECT id, photo_url, room_name, description, created_at FROM project_photos WHERE project_id = %s ORDER BY created_at DESC",
                 (project_id,)
             )
-            photos = cursor.fetchall()
+            photos = encoder.rows(cursor)
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({
-                    'photos': [
-                        {
-                            'id': p[0],
-                            'photo_url': p[1],
-                            'room_name': p[2],
-                            'description': p[3],
-                            'created_at': p[4].isoformat() if p[4] else None
-                        } for p in photos
-                    ]
-                })
+                    'photos': photos
+                }, ensure_ascii=False)
             }
         
         elif method == 'POST':
@@ -70,7 +68,7 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'project_id and photo are required'})
+                    'body': json.dumps({'error': 'project_id and photo are required'}, ensure_ascii=False)
                 }
             
             try:
@@ -79,26 +77,12 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Invalid base64 photo data'})
+                    'body': json.dumps({'error': 'Invalid base64 photo data'}, ensure_ascii=False)
                 }
             
-            s3 = boto3.client('s3',
-                endpoint_url='https://bucket.poehali.dev',
-                aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-                aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
-            )
-            
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             file_key = f"projects/{project_id}/photos/{timestamp}.jpg"
-            
-            s3.put_object(
-                Bucket='files',
-                Key=file_key,
-                Body=photo_data,
-                ContentType='image/jpeg'
-            )
-            
-            cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{file_key}"
+            cdn_url = storage.put(file_key, photo_data, 'image/jpeg')
             
             cursor.execute(
                 "INSERT INTO project_photos (project_id, photo_url, room_name, description) VALUES (%s, %s, %s, %s) RETURNING id",
@@ -106,6 +90,7 @@ def handler(event: dict, context) -> dict:
             )
             photo_id = cursor.fetchone()[0]
             conn.commit()
+            project_cache.invalidate(project_id)
             
             return {
                 'statusCode': 201,
@@ -115,7 +100,7 @@ def handler(event: dict, context) -> dict:
                     'photo_id': photo_id,
                     'photo_url': cdn_url,
                     'message': 'Photo uploaded successfully'
-                })
+                }, ensure_ascii=False)
             }
         
         elif method == 'DELETE':
@@ -126,11 +111,14 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'photo_id is required'})
+                    'body': json.dumps({'error': 'photo_id is required'}, ensure_ascii=False)
                 }
             
-            cursor.execute("DELETE FROM project_photos WHERE id = %s", (photo_id,))
+            cursor.execute("DELETE FROM project_photos WHERE id = %s RETURNING project_id", (photo_id,))
+            deleted = cursor.fetchone()
             conn.commit()
+            if deleted:
+                project_cache.invalidate(deleted[0])
             
             return {
                 'statusCode': 200,
@@ -138,14 +126,14 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({
                     'success': True,
                     'message': 'Photo deleted successfully'
-                })
+                }, ensure_ascii=False)
             }
         
         else:
             return {
                 'statusCode': 405,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Method not allowed'})
+                'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)
             }
     
     except Exception as e:
@@ -153,8 +141,8 @@ def handler(event: dict, context) -> dict:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
         }
     finally:
         cursor.close()
-        conn.close()
+        db.release(conn)
@@ -1,9 +1,252 @@
+import base64
 import json
-import os
-import psycopg2
-from datetime import datetime
-from decimal import Decimal
+from datetime import date, datetime
 
+import cache
+import compression
+import db
+import encoder
+import telemetry
+
+# Проект, его замеры и фото одним запросом. ETag считается из updated_at и xmin проекта
+# и версий (xmin) дочерних строк; при совпадении с If-None-Match тело не собирается.
+PROJECT_DETAIL_SQL = """
+    WITH p AS (
+        SELECT id, user_id, title, address, project_type, area, rooms, budget, description,
+               status, progress, start_date, deadline, created_at, updated_at, xmin::text AS row_version
+        FROM projects
+        WHERE id = %(project_id)s
+    ),
+    v AS (
+        SELECT md5(concat_ws('|', p.id, p.updated_at, p.row_version,
+            (SELECT string_agg(m.id::text || ':' || m.xmin::text, ',' ORDER BY m.id)
+             FROM room_measurements m WHERE m.project_id = p.id),
+            (SELECT string_agg(ph.id::text || ':' || ph.xmin::text, ',' ORDER BY ph.id)
+             FROM project_photos ph WHERE ph.project_id = p.id)
+        )) AS etag
+        FROM p
+    )
+    SELECT v.etag,
+           CASE WHEN v.etag = ANY(%(if_none_match)s) THEN NULL ELSE json_build_object(
+               'project', json_build_object(
+                   'id', p.id,
+                   'user_id', p.user_id,
+                   'title', p.title,
+                   'address', p.address,
+                   'project_type', p.project_type,
+                   'area', p.area,
+                   'rooms', p.rooms,
+                   'budget', p.budget,
+                   'description', p.description,
+                   'status', p.status,
+                   'progress', p.progress,
+                   'start_date', p.start_date,
+                   'deadline', p.deadline,
+                   'created_at', p.created_at
+               ),
+               'measurements', COALESCE((
+                   SELECT json_agg(json_build_object(
+                       'id', m.id,
+                       'room_name', m.room_name,
+                       'length', m.length,
+                       'width', m.width,
+                       'height', m.height,
+                       'area', m.area,
+                       'notes', m.notes
+                   ) ORDER BY m.id)
+                   FROM room_measurements m WHERE m.project_id = p.id
+               ), '[]'::json),
+               'photos', COALESCE((
+                   SELECT json_agg(json_build_object(
+                       'id', ph.id,
+                       'photo_url', ph.photo_url,
+                       'room_name', ph.room_name,
+                       'description', ph.description,
+                       'created_at', ph.created_at
+                   ) ORDER BY ph.id)
+                   FROM project_photos ph WHERE ph.project_id = p.id
+               ), '[]'::json)
+           )::text END AS body
+    FROM p, v
+"""
+
+# Поля, которые можно запросить в списке проектов через fields=
+LIST_FIELDS = ('id', 'title', 'address', 'project_type', 'area', 'rooms', 'budget', 'status', 'progress', 'start_date', 'deadline', 'created_at')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Поля, которые можно менять через PUT, и их типы в таблице projects
+UPDATABLE_FIELDS = {
+    'title': 'varchar',
+    'address': 'varchar',
+    'project_type': 'varchar',
+    'area': 'numeric',
+    'rooms': 'integer',
+    'budget': 'numeric',
+    'description': 'text',
+    'status': 'varchar',
+    'progress': 'integer',
+    'start_date': 'date',
+    'deadline': 'date'
+}
+PROJECT_TYPES = ('apartment', 'house', 'office', 'commercial')
+PROJECT_STATUSES = ('draft', 'measurement', 'design', 'estimate', 'in_progress', 'completed', 'cancelled')
+MAX_BULK_UPDATE = 200
+
+# Собранный ответ GET ?project_id= как [etag, body]; сбрасывается при записи в projects, measurements и photos
+project_cache = cache.Cache('project')
+
+# Пакетное обновление одним UPDATE: каждый элемент JSON-массива меняет только переданные в нём поля
+BULK_UPDATE_SQL = """
+    UPDATE projects AS p SET
+        {assignments},
+        updated_at = NOW()
+    FROM (
+        SELECT (e->>'project_id')::integer AS id, e AS doc
+        FROM jsonb_array_elements(%s::jsonb) AS e
+    ) AS u
+    WHERE p.id = u.id
+    RETURNING p.id
+""".format(assignments=',\n        '.join(
+    f"{field} = CASE WHEN u.doc ? '{field}' THEN (u.doc->>'{field}')::{sql_type} ELSE p.{field} END"
+    for field, sql_type in UPDATABLE_FIELDS.items()
+))
+
+def validate_update(item: dict):
+    '''Ошибка элемента пакетного обновления или None; проверки повторяют ограничения таблицы projects'''
+    if not isinstance(item, dict):
+        return 'Item must be an object'
+    if not isinstance(item.get('project_id'), int) or isinstance(item.get('project_id'), bool):
+        return 'project_id is required'
+    if not any(field in item for field in UPDATABLE_FIELDS):
+        return 'No fields to update'
+    for field in ('title', 'address', 'project_type'):
+        if field in item and not (isinstance(item[field], str) and item[field]):
+            return f'Invalid {field}'
+    if 'project_type' in item and item['project_type'] not in PROJECT_TYPES:
+        return 'Invalid project_type'
+    if 'status' in item and item['status'] not in PROJECT_STATUSES:
+        return 'Invalid status'
+    for field in ('area', 'budget', 'rooms', 'progress'):
+        value = item.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return f'Invalid {field}'
+    for field in ('rooms', 'progress'):
+        if field in item and item[field] is not None and item[field] != int(item[field]):
+            return f'Invalid {field}'
+    if item.get('progress') is not None and not 0 <= item['progress'] <= 100:
+        return 'Invalid progress'
+    for field in ('start_date', 'deadline'):
+        if item.get(field) is not None:
+            try:
+                date.fromisoformat(item[field])
+            except (TypeError, ValueError):
+                return f'Invalid {field}'
+    return None
+
+def bulk_update_projects(conn, cursor, items) -> dict:
+    '''PUT {"projects": [{"project_id": 1, "progress": 40}, ...]} — все элементы в одной транзакции'''
+    if not isinstance(items, list) or not items:
+        return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'projects must be a non-empty list'}, ensure_ascii=False)}
+    if len(items) > MAX_BULK_UPDATE:
+        return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': f'At most {MAX_BULK_UPDATE} projects per request'}, ensure_ascii=False)}
+    
+    results = []
+    valid = []
+    seen = set()
+    for item in items:
+        error = validate_update(item)
+        project_id = item.get('project_id') if isinstance(item, dict) else None
+        if not error and project_id in seen:
+            error = 'Duplicate project_id'
+        if error:
+            results.append({'project_id': project_id, 'status': 'invalid', 'error': error})
+            continue
+        seen.add(project_id)
+        update = {k: v for k, v in item.items() if k == 'project_id' or k in UPDATABLE_FIELDS}
+        for field in ('rooms', 'progress'):
+            if update.get(field) is not None:
+                update[field] = int(update[field])
+        valid.append(update)
+        results.append({'project_id': project_id, 'status': None})
+    
+    updated = set()
+    if valid:
+        cursor.execute(BULK_UPDATE_SQL, (json.dumps(valid, ensure_ascii=False),))
+        updated = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+        project_cache.invalidate(*updated)
+    
+    for result in results:
+        if result['status'] is None:
+            result['status'] = 'updated' if result['project_id'] in updated else 'not_found'
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'success': True,
+            'updated': len(updated),
+            'results': results
+        }, ensure_ascii=False)
+    }
+
+def encode_cursor(created_at: str, project_id: int) -> str:
+    '''Курсор страницы: позиция последнего проекта в порядке (created_at, id) DESC'''
+    raw = json.dumps([created_at, project_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(value: str) -> tuple:
+    raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+    created_at, project_id = json.loads(raw)
+    return datetime.fromisoformat(created_at), int(project_id)
+
+def parse_if_none_match(event: dict) -> list:
+    '''Значения If-None-Match без кавычек и префикса W/'''
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'if-none-match'), '') or ''
+    return [tag.strip().removeprefix('W/').strip('"') for tag in value.split(',') if tag.strip()]
+
+def project_detail(project_id: int, if_none_match: list) -> dict:
+    '''GET ?project_id= через кеш; соединение с БД берётся только при промахе'''
+    fetched = {}
+    
+    def load():
+        with db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(PROJECT_DETAIL_SQL, {'project_id': project_id, 'if_none_match': if_none_match})
+                fetched['row'] = cursor.fetchone()
+        row = fetched['row']
+        # Ответ 304 без тела не кешируется: закешировать нечего
+        return list(row) if row and row[1] is not None else None
+    
+    try:
+        row = project_cache.get_or_load(project_id, load) or fetched.get('row')
+    except Exception as e:
+        return {'statusCode': 500, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': str(e)}, ensure_ascii=False)}
+    
+    if not row:
+        return {'statusCode': 404, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Project not found'}, ensure_ascii=False)}
+    
+    etag, body = row
+    cache_headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'private, no-cache',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+    
+    if body is None or etag in if_none_match:
+        return {'statusCode': 304, 'headers': cache_headers, 'body': ''}
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', **cache_headers},
+        'body': body
+    }
+
+@telemetry.instrument
+@compression.negotiate
 def handler(event: dict, context) -> dict:
     '''API для управления проектами заказчиков'''
     
@@ -15,117 +258,79 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    project_id = (event.get('queryStringParameters') or {}).get('project_id')
+    if method == 'GET' and project_id:
+        if not project_id.isdigit():
+            return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Invalid project_id'}, ensure_ascii=False)}
+        return project_detail(int(project_id), parse_if_none_match(event))
+    
+    conn = db.acquire()
     cursor = conn.cursor()
     
     try:
         if method == 'GET':
             user_id = event.get('queryStringParameters', {}).get('user_id')
-            project_id = event.get('queryStringParameters', {}).get('project_id')
             
-            if project_id:
-                cursor.execute(
-                    "SELECT id, user_id, title, address, project_type, area, rooms, budget, description, status, progress, start_date, deadline, created_at FROM projects WHERE id = %s",
-                    (project_id,)
-                )
-                project = cursor.fetchone()
+            if user_id:
+                params = event.get('queryStringParameters') or {}
                 
-                if not project:
-                    return {'statusCode': 404, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Project not found'})}
+                fields = [f.strip() for f in params['fields'].split(',') if f.strip()] if params.get('fields') else list(LIST_FIELDS)
+                unknown = [f for f in fields if f not in LIST_FIELDS]
+                if unknown:
+                    return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': f"Unknown fields: {', '.join(unknown)}"}, ensure_ascii=False)}
                 
-                cursor.execute(
-                    "SELECT id, room_name, length, width, height, area, notes FROM room_measurements WHERE project_id = %s",
-                    (project_id,)
-                )
-                measurements = cursor.fetchall()
+                try:
+                    limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                    after = decode_cursor(params['cursor']) if params.get('cursor') else None
+                except (ValueError, TypeError):
+                    return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Invalid limit or cursor'}, ensure_ascii=False)}
                 
-                cursor.execute(
-                    "SELECT id, photo_url, room_name, description, created_at FROM project_photos WHERE project_id = %s",
-                    (project_id,)
-                )
-                photos = cursor.fetchall()
+                # id и created_at нужны для курсора, даже если их не запросили
+                columns = list(dict.fromkeys(['id', 'created_at'] + fields))
+                query = f"SELECT {', '.join(columns)} FROM projects WHERE user_id = %s"
+                values = [user_id]
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'project': {
-                            'id': project[0],
-                            'user_id': project[1],
-                            'title': project[2],
-                            'address': project[3],
-                            'project_type': project[4],
-                            'area': float(project[5]) if project[5] else None,
-                            'rooms': project[6],
-                            'budget': float(project[7]) if project[7] else None,
-                            'description': project[8],
-                            'status': project[9],
-                            'progress': project[10],
-                            'start_date': project[11].isoformat() if project[11] else None,
-                            'deadline': project[12].isoformat() if project[12] else None,
-                            'created_at': project[13].isoformat() if project[13] else None
-                        },
-                        'measurements': [
-                            {
-                                'id': m[0],
-                                'room_name': m[1],
-                                'length': float(m[2]),
-                                'width': float(m[3]),
-                                'height': float(m[4]),
-                                'area': float(m[5]) if m[5] else None,
-                                'notes': m[6]
-                            } for m in measurements
-                        ],
-                        'photos': [
-                            {
-                                'id': p[0],
-                                'photo_url': p[1],
-                                'room_name': p[2],
-                                'description': p[3],
-                                'created_at': p[4].isoformat() if p[4] else None
-                            } for p in photos
-                        ]
-                    })
-                }
-            
-            elif user_id:
-                cursor.execute(
-                    "SELECT id, title, address, project_type, area, rooms, budget, status, progress, start_date, deadline, created_at FROM projects WHERE user_id = %s ORDER BY created_at DESC",
-                    (user_id,)
-                )
-                projects = cursor.fetchall()
+                for name in ('status', 'project_type'):
+                    if params.get(name):
+                        query += f" AND {name} = %s"
+                        values.append(params[name])
+                
+                if after:
+                    query += " AND (created_at, id) < (%s, %s)"
+                    values.extend(after)
+                
+                query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+                values.append(limit + 1)
+                
+                cursor.execute(query, values)
+                projects = encoder.rows(cursor)
+                
+                next_cursor = None
+                if len(projects) > limit:
+                    projects = projects[:limit]
+                    next_cursor = encode_cursor(projects[-1]['created_at'], projects[-1]['id'])
+                
+                for column in columns[:2]:
+                    if column not in fields:
+                        for project in projects:
+                            del project[column]
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({
-                        'projects': [
-                            {
-                                'id': p[0],
-                                'title': p[1],
-                                'address': p[2],
-                                'project_type': p[3],
-                                'area': float(p[4]) if p[4] else None,
-                                'rooms': p[5],
-                                'budget': float(p[6]) if p[6] else None,
-                                'status': p[7],
-                                'progress': p[8],
-                                'start_date': p[9].isoformat() if p[9] else None,
-                                'deadline': p[10].isoformat() if p[10] else None,
-                                'created_at': p[11].isoformat() if p[11] else None
-                            } for p in projects
-                        ]
-                    })
+                        'projects': projects,
+                        'next_cursor': next_cursor
+                    }, ensure_ascii=False)
                 }
             
             else:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'user_id or project_id is required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'user_id or project_id is required'}, ensure_ascii=False)}
         
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
@@ -140,7 +345,7 @@ def handler(event: dict, context) -> dict:
             description = body.get('description')
             
             if not all([user_id, title, address]):
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'user_id, title and address are required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'user_id, title and address are required'}, ensure_ascii=False)}
             
             cursor.execute(
                 "INSERT INTO projects (user_id, title, address, project_type, area, rooms, budget, description) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
@@ -156,26 +361,29 @@ def handler(event: dict, context) -> dict:
                     'success': True,
                     'project_id': project_id,
                     'message': 'Project created successfully'
-                })
+                }, ensure_ascii=False)
             }
         
         elif method == 'PUT':
             body = json.loads(event.get('body', '{}'))
             
+            if 'projects' in body:
+                return bulk_update_projects(conn, cursor, body['projects'])
+            
             project_id = body.get('project_id')
             if not project_id:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'project_id is required'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'project_id is required'}, ensure_ascii=False)}
             
             updates = []
             values = []
             
-            for field in ['title', 'address', 'project_type', 'area', 'rooms', 'budget', 'description', 'status', 'progress', 'start_date', 'deadline']:
+            for field in UPDATABLE_FIELDS:
                 if field in body:
                     updates.append(f"{field} = %s")
                     values.append(body[field])
             
             if not updates:
-                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'No fields to update'})}
+                return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'No fields to update'}, ensure_ascii=False)}
             
             updates.append("updated_at = NOW()")
             values.append(project_id)
@@ -185,6 +393,7 @@ def handler(event: dict, context) -> dict:
                 values
             )
             conn.commit()
+            project_cache.invalidate(project_id)
             
             return {
                 'statusCode': 200,
@@ -192,20 +401,20 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({
                     'success': True,
                     'message': 'Project updated successfully'
-                })
+                }, ensure_ascii=False)
             }
         
         else:
-            return {'statusCode': 405, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Method not allowed'})}
+            return {'statusCode': 405, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False)}
     
     except Exception as e:
         conn.rollback()
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
         }
     
     finally:
         cursor.close()
-        conn.close()
+        db.release(conn)
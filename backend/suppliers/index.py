@@ -1,7 +1,760 @@
+import base64
+import csv
+import gzip
+import hashlib
+import io
 import json
 import os
-import psycopg2
+import re
+import time
 
+import cache
+import compression
+import db
+import encoder
+import storage
+import telemetry
+
+PRODUCTS_SQL = """
+    SELECT 
+        p.id,
+        p.name,
+        p.description,
+        p.category,
+        p.subcategory,
+        COALESCE(p.price, 0) AS price,
+        p.unit,
+        p.image_url,
+        p.in_stock,
+        COALESCE(p.min_order_quantity, 1) AS min_order_quantity,
+        p.delivery_available,
+        COALESCE(p.delivery_cost, 0) AS delivery_cost,
+        p.delivery_days,
+        COALESCE(p.floor_lifting_cost, 0) AS floor_lifting_cost,
+        p.specifications,
+        p.created_at,
+        s.id AS "supplier.id",
+        s.company_name AS "supplier.name",
+        COALESCE(s.rating, 0) AS "supplier.rating",
+        s.verified AS "supplier.verified"{rank},
+        {sort_key} AS sort_key
+    FROM supplier_products p
+    JOIN suppliers s ON p.supplier_id = s.id
+"""
+
+# Релевантность поиска: ts_rank_cd по search_vector (0..1) плюс word_similarity названия (0..1);
+# точное совпадение артикула добавляет 2 и всегда идёт первым
+RANK_EXPRESSION = """(ts_rank_cd(p.search_vector, websearch_to_tsquery('russian', %(search)s), 32)
+         + word_similarity(%(search)s, p.name)
+         + CASE WHEN lower(p.sku) = lower(%(search)s) THEN 2 ELSE 0 END)::float"""
+RANK_SQL = f""",
+        {RANK_EXPRESSION} AS rank"""
+
+# Сортировки каталога: ключ, направление и тип ключа в курсоре; у ключей-колонок есть индекс (ключ, id) из V0012
+SORTS = {
+    'newest': ('p.created_at', 'DESC', 'timestamp'),
+    'price': ('p.price', 'ASC', 'numeric'),
+    'price_desc': ('p.price', 'DESC', 'numeric'),
+    'rating': ('p.supplier_rating', 'DESC', 'numeric'),
+    'delivery': ('p.delivery_days', 'ASC', 'integer'),
+    'relevance': (RANK_EXPRESSION, 'DESC', 'float'),
+}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(sort: str, key, product_id: int) -> str:
+    '''Курсор страницы: сортировка и позиция последнего товара в порядке (ключ, id)'''
+    raw = json.dumps([sort, key, product_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(value: str, sort: str) -> tuple:
+    raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+    cursor_sort, key, product_id = json.loads(raw)
+    if cursor_sort != sort or key is None:
+        raise ValueError('cursor does not match sort')
+    return key, int(product_id)
+
+# Слова запроса ищутся по search_vector (индекс GIN), опечатки — по триграммам названия (<%),
+# часть названия или артикула — через ILIKE по тому же триграммному индексу
+SEARCH_CONDITION = """(
+    p.search_vector @@ websearch_to_tsquery('russian', %(search)s)
+    OR %(search)s <%% p.name
+    OR p.name ILIKE %(search_pattern)s
+    OR p.sku ILIKE %(search_pattern)s
+)"""
+
+def like_pattern(text: str) -> str:
+    '''Подстрока для LIKE: символы шаблона % и _ экранируются'''
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+# Границы ценовых корзин фасета price: [0, 500), [500, 1000), ..., [50000, ∞)
+PRICE_BUCKETS = (500, 1000, 2500, 5000, 10000, 50000)
+# Фасет -> значение, по которому он группируется
+FACETS = {
+    'category': 'p.category',
+    'subcategory': 'p.subcategory',
+    'supplier': 'p.supplier_id',
+    'in_stock': 'p.in_stock',
+    'price': 'width_bucket(p.price, %(price_edges)s::numeric[])',
+}
+
+# Фильтры по характеристикам: spec.class=33 или spec.class=32,33 — совпадение (@> по индексу GIN),
+# spec.thickness>=8 и spec.thickness<=12 — диапазон по числу в начале значения («12мм» -> 12).
+# Строка запроса spec.thickness>=8 приходит как параметр «spec.thickness>» со значением 8.
+SPEC_PARAM = re.compile(r'^spec\.([A-Za-z_][A-Za-z0-9_]*)([<>]?)$')
+SPEC_MAX_KEYS = 8
+
+def spec_filters(params: dict, values: dict) -> dict:
+    '''Фасеты spec.<ключ> из фильтров spec.* и списка spec_facets: {фасет: (значение, условие)}'''
+    keys = {}
+    for name, value in params.items():
+        match = SPEC_PARAM.match(name)
+        if match:
+            keys.setdefault(match.group(1), []).append((match.group(2), value))
+    for key in (params.get('spec_facets') or '').split(','):
+        if key.strip():
+            if not SPEC_PARAM.match(f'spec.{key.strip()}'):
+                raise ValueError(f'Invalid spec_facets key: {key.strip()}')
+            keys.setdefault(key.strip(), [])
+    if len(keys) > SPEC_MAX_KEYS:
+        raise ValueError(f'At most {SPEC_MAX_KEYS} specification keys')
+    
+    facets = {}
+    for n, (key, filters) in enumerate(sorted(keys.items())):
+        values[f'spec_{n}'] = key
+        field = f'p.specifications ->> %(spec_{n})s'
+        conditions = []
+        for operator, value in filters:
+            if operator:
+                bound = f"spec_{n}_{'min' if operator == '>' else 'max'}"
+                try:
+                    values[bound] = float(str(value).replace(',', '.'))
+                except ValueError:
+                    raise ValueError(f'spec.{key}{operator}= must be a number')
+                # spec_number() и индексы по выражению для частых ключей — в V0014
+                conditions.append(f'spec_number({field}) {operator}= %({bound})s')
+                continue
+            variants = []
+            for i, option in enumerate(v.strip() for v in str(value).split(',') if v.strip()):
+                # Значение может храниться строкой ("33") или числом (33)
+                documents = [{key: option}]
+                if re.fullmatch(r'-?\d+(\.\d+)?', option):
+                    documents.append({key: json.loads(option)})
+                for j, document in enumerate(documents):
+                    values[f'spec_{n}_{i}_{j}'] = json.dumps(document, ensure_ascii=False)
+                    variants.append(f'p.specifications @> %(spec_{n}_{i}_{j})s::jsonb')
+            if variants:
+                conditions.append('(' + ' OR '.join(variants) + ')')
+        facets[f'spec.{key}'] = (field, ' AND '.join(conditions) or 'true')
+    return facets
+
+def catalog_filters(params: dict) -> tuple:
+    '''
+    Условия каталога из query string: (общие условия, фасеты {имя: (значение, условие)}, параметры).
+    Фасет считается по всем условиям, кроме своего, поэтому выбранная категория не скрывает остальные.
+    ValueError — некорректный фильтр.
+    '''
+    conditions = []
+    facet_conditions = dict.fromkeys(FACETS, 'true')
+    values = {'price_edges': list(PRICE_BUCKETS)}
+    
+    if params.get('in_stock', 'true') == 'true':
+        facet_conditions['in_stock'] = 'p.in_stock = true'
+    
+    if params.get('category'):
+        facet_conditions['category'] = 'p.category = %(category)s'
+        values['category'] = params['category']
+    
+    if params.get('subcategory'):
+        facet_conditions['subcategory'] = 'p.subcategory = %(subcategory)s'
+        values['subcategory'] = params['subcategory']
+    
+    if params.get('supplier_id'):
+        if not str(params['supplier_id']).isdigit():
+            raise ValueError('supplier_id must be an integer')
+        facet_conditions['supplier'] = 'p.supplier_id = %(supplier_id)s'
+        values['supplier_id'] = int(params['supplier_id'])
+    
+    price = []
+    for name, operator in (('price_min', '>='), ('price_max', '<')):
+        if params.get(name):
+            try:
+                values[name] = float(params[name])
+            except ValueError:
+                raise ValueError(f'{name} must be a number')
+            price.append(f'p.price {operator} %({name})s')
+    if price:
+        facet_conditions['price'] = ' AND '.join(price)
+    
+    search = ' '.join((params.get('search') or '').split())
+    if search:
+        conditions.append(SEARCH_CONDITION)
+        values['search'] = search
+        values['search_pattern'] = like_pattern(search)
+    
+    facets = {name: (FACETS[name], condition) for name, condition in facet_conditions.items()}
+    facets.update(spec_filters(params, values))
+    return conditions, facets, values
+
+def facets_sql(conditions: list, facets: dict) -> str:
+    '''
+    CTE facets одним проходом: строки, прошедшие все условия, кроме не более чем одного фасетного,
+    группируются GROUPING SETS по каждому фасету; count фасета — строки, прошедшие все условия, кроме его собственного
+    '''
+    names = list(facets)
+    columns = [f'{value} AS g{i}' for i, (value, _) in enumerate(facets.values())]
+    # NULL (например, пустая subcategory) считается несовпадением
+    flags = [f'COALESCE({condition}, false) AS m{i}' if condition != 'true' else f'true AS m{i}'
+             for i, (_, condition) in enumerate(facets.values())]
+    active = [f'COALESCE({condition}, false)::int' for _, condition in facets.values() if condition != 'true']
+    if len(active) > 1:
+        conditions = conditions + [f"{' + '.join(active)} >= {len(active) - 1}"]
+    
+    def others(i):
+        return ' AND '.join(f'm{j}' for j in range(len(names)) if j != i) or 'true'
+    
+    def case(template):
+        return 'CASE ' + ' '.join(f'WHEN GROUPING(g{i}) = 0 THEN {template(i)}' for i in range(len(names))) + ' END'
+    
+    return f"""
+    facet_rows AS (
+        SELECT {', '.join(columns)},
+               {', '.join(flags)}
+        FROM supplier_products p
+        WHERE {' AND '.join(conditions) or 'true'}
+    ),
+    facet_counts AS (
+        SELECT {case(lambda i: "'" + names[i] + "'")} AS facet,
+               {case(lambda i: f'to_jsonb(g{i})')} AS value,
+               {case(lambda i: f'COUNT(*) FILTER (WHERE {others(i)})')} AS count
+        FROM facet_rows
+        GROUP BY GROUPING SETS ({', '.join(f'(g{i})' for i in range(len(names)))})
+    ),
+    facets AS (
+        SELECT COALESCE(jsonb_object_agg(facet, buckets), '{{}}'::jsonb) AS facets
+        FROM (
+            SELECT c.facet,
+                   jsonb_agg(
+                       jsonb_build_object('value', c.value, 'count', c.count)
+                       || CASE c.facet
+                              WHEN 'supplier' THEN jsonb_build_object('name', s.company_name)
+                              WHEN 'price' THEN jsonb_build_object(
+                                  'from', COALESCE((%(price_edges)s::numeric[])[(c.value)::int], 0),
+                                  'to', (%(price_edges)s::numeric[])[(c.value)::int + 1])
+                              ELSE '{{}}'::jsonb
+                          END
+                       ORDER BY CASE WHEN c.facet = 'price' THEN c.value END, c.count DESC, c.value
+                   ) AS buckets
+            FROM facet_counts c
+            LEFT JOIN suppliers s ON c.facet = 'supplier' AND to_jsonb(s.id) = c.value
+            -- Товары без характеристики не образуют корзину spec.*
+            WHERE c.count > 0 AND (c.value IS NOT NULL OR c.facet NOT LIKE 'spec.%%')
+            GROUP BY c.facet
+        ) f
+    )
+"""
+
+def catalog_query(conditions: list, facets: dict, sort: str, after: bool, limit: int, with_facets: bool) -> str:
+    '''
+    SQL страницы каталога. after — продолжение после курсора %(after_key)s, %(after_id)s (только для страницы).
+    С фасетами — один запрос: CTE facets считается одним группирующим проходом,
+    а страница присоединяется к нему, поэтому строка есть даже при пустой странице;
+    facets заполнен только в первой строке (position 1 или NULL).
+    '''
+    key, direction, key_type = SORTS[sort]
+    order_by = f'sort_key {direction}, id {direction}'
+    searching = SEARCH_CONDITION in conditions
+    page_sql = PRODUCTS_SQL.format(rank=RANK_SQL if searching else '', sort_key=key)
+    page_conditions = conditions + [c for _, c in facets.values() if c != 'true']
+    if after:
+        # Сравнение строк (ключ, id) идёт по индексу (ключ, id) в нужную сторону
+        operator = '<' if direction == 'DESC' else '>'
+        page_conditions.append(f'({key}, p.id) {operator} (%(after_key)s::{key_type}, %(after_id)s)')
+    page_sql += ' WHERE ' + (' AND '.join(page_conditions) or 'true')
+    page_sql += f' ORDER BY {order_by} LIMIT {int(limit)}'
+    if not with_facets:
+        return page_sql
+    
+    return f"""
+        WITH {facets_sql(conditions, facets)},
+        page AS (
+            SELECT page.*, row_number() OVER (ORDER BY {order_by}) AS position
+            FROM ({page_sql}) page
+        )
+        SELECT page.*, CASE WHEN page.position IS NULL OR page.position = 1 THEN facets.facets END AS facets
+        FROM facets
+        LEFT JOIN page ON true
+        ORDER BY page.position
+    """
+
+def catalog_page(cursor, params: dict) -> dict:
+    '''Ответ GET каталога: страница, курсор и фасеты. ValueError — некорректные параметры'''
+    conditions, facets, values = catalog_filters(params)
+    
+    sort = params.get('sort') or ('relevance' if 'search' in values else 'newest')
+    if sort not in SORTS or (sort == 'relevance' and 'search' not in values):
+        raise ValueError(f"sort must be one of: {', '.join(SORTS)} (relevance requires search)")
+    
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        if params.get('cursor'):
+            values['after_key'], values['after_id'] = decode_cursor(params['cursor'], sort)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid limit or cursor')
+    
+    # Фасеты нужны боковой панели один раз — на первой странице
+    with_facets = params.get('facets', '0' if params.get('cursor') else '1') != '0'
+    cursor.execute(catalog_query(conditions, facets, sort, 'after_id' in values, limit + 1, with_facets), values)
+    products = encoder.rows(cursor)
+    
+    facets = None
+    if with_facets:
+        facets = products[0]['facets']
+        products = [p for p in products if p['id'] is not None]
+        for product in products:
+            del product['position'], product['facets']
+    
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = encode_cursor(sort, products[-1]['sort_key'], products[-1]['id'])
+    for product in products:
+        del product['sort_key']
+    
+    result = {'products': products, 'total': len(products), 'next_cursor': next_cursor, 'sort': sort}
+    if facets is not None:
+        result['facets'] = facets
+        # Список категорий для фильтра в прежнем формате
+        result['categories'] = sorted(item['value'] for item in facets.get('category', []))
+    return result
+
+# Лента изменений (?since=): товары, изменённые после курсора, включая снятые с продажи.
+# Триггер ставит каждой записи номер её транзакции change_xid (V0017, V0019); лента идёт в порядке
+# (change_xid, id) и отдаёт только транзакции младше xmin снимка БД: все они завершены, а любая ещё
+# не закоммиченная запись получит change_xid не меньше xmin и попадёт в следующие страницы
+CHANGES_WATERMARK_SQL = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+CHANGES_SQL = PRODUCTS_SQL.format(rank='', sort_key='p.change_xid') + """
+    WHERE (p.change_xid, p.id) > (%(after_xid)s, %(after_id)s)
+      AND p.change_xid < %(watermark)s
+    ORDER BY p.change_xid, p.id
+    LIMIT %(limit)s
+"""
+
+def catalog_changes(cursor, since: str, limit: int) -> dict:
+    '''
+    Страница ленты изменений после курсора since ('0' — с начала, для первой полной загрузки).
+    Отдаются только транзакции младше watermark — xmin снимка, то есть старейшей незавершённой транзакции
+    во всём кластере БД. Пока открыта любая долгая транзакция (даже не трогающая каталог), watermark стоит,
+    и лента отстаёт от записей на её длительность
+    '''
+    after_xid, after_id = (0, 0) if since == '0' else decode_cursor(since, 'changes')
+    cursor.execute(CHANGES_WATERMARK_SQL)
+    watermark = cursor.fetchone()[0]
+    cursor.execute(CHANGES_SQL, {
+        'after_xid': int(after_xid), 'after_id': after_id, 'watermark': watermark, 'limit': limit + 1
+    })
+    products = encoder.rows(cursor)
+    
+    has_more = len(products) > limit
+    products = products[:limit]
+    if has_more:
+        next_cursor = encode_cursor('changes', products[-1]['sort_key'], products[-1]['id'])
+    else:
+        # Всё, что завершилось до watermark, отдано: следующий опрос начинается с него
+        next_cursor = encode_cursor('changes', max(watermark, int(after_xid)), 0)
+    for product in products:
+        del product['sort_key']
+    return {'changes': products, 'total': len(products), 'next_cursor': next_cursor, 'has_more': has_more}
+
+# Снимки каталога: ответ GET без персональных параметров (первая страница всего каталога или одной категории)
+# собирается заранее, сжимается gzip и кладётся в бакет под ключом с хешем содержимого, поэтому объект неизменяем.
+# latest.json категории указывает на последний снимок. CATALOG_SNAPSHOTS=serve отдаёт снимок без обращения к БД,
+# redirect — перенаправляет на CDN, off — отключает. Снимки есть только у категорий из supplier_products:
+# их пересобирает сам запрос записи товаров после commit или action=rebuild_snapshots.
+# Снимок отдаётся до следующей пересборки. Рейтинг поставщика меняется в обход suppliers, поэтому
+# action=rebuild_snapshots вызывается по расписанию; SNAPSHOT_MAX_AGE > 0 дополнительно перестаёт отдавать
+# снимок старше стольких секунд, и без снимка GET отвечает из БД
+SNAPSHOT_MODE = os.environ.get('CATALOG_SNAPSHOTS', 'serve')
+SNAPSHOT_MAX_AGE = int(os.environ.get('CATALOG_SNAPSHOT_MAX_AGE', '0'))
+SNAPSHOT_PREFIX = 'catalog/snapshots'
+snapshot_cache = cache.Cache('catalog-snapshot')
+
+def snapshot_params(params: dict):
+    '''Категория снимка ('' — весь каталог) или None, если запрос нельзя отдать снимком'''
+    if SNAPSHOT_MODE not in ('serve', 'redirect'):
+        return None
+    if any(value for name, value in params.items() if name != 'category'):
+        return None
+    return params.get('category') or ''
+
+def snapshot_slug(category: str) -> str:
+    return hashlib.sha1(category.encode()).hexdigest()[:16] if category else 'all'
+
+def publish_snapshot(category: str, body: str) -> dict:
+    '''Кладёт сжатый снимок и переключает на него latest.json категории'''
+    etag = hashlib.sha256(body.encode()).hexdigest()[:20]
+    key = f'{SNAPSHOT_PREFIX}/{snapshot_slug(category)}/{etag}.json.gz'
+    data = gzip.compress(body.encode(), mtime=0)
+    url = storage.put(key, data, 'application/json', content_encoding='gzip',
+                      cache_control='public, max-age=31536000, immutable')
+    pointer = {'category': category, 'etag': etag, 'key': key, 'url': url, 'bytes': len(data), 'built_at': time.time()}
+    storage.put(f'{SNAPSHOT_PREFIX}/{snapshot_slug(category)}/latest.json',
+                json.dumps(pointer, ensure_ascii=False).encode(), 'application/json', cache_control='no-cache')
+    snapshot_cache.invalidate(snapshot_slug(category))
+    return pointer
+
+def rebuild_snapshots(conn, cursor, categories) -> dict:
+    '''
+    Снимки категорий, которые есть в supplier_products, и всего каталога: {'snapshots': [...], 'failed': [...]}.
+    Ошибка одной категории не мешает остальным и уходит в telemetry.report_error
+    '''
+    if SNAPSHOT_MODE not in ('serve', 'redirect'):
+        return {'snapshots': [], 'failed': []}
+    cursor.execute('SELECT DISTINCT category FROM supplier_products WHERE category = ANY(%s::text[])',
+                   ([c for c in categories if c],))
+    existing = {row[0] for row in cursor.fetchall()}
+    built, failed = [], []
+    for category in sorted({''} | existing):
+        try:
+            result = catalog_page(cursor, {'category': category} if category else {})
+            built.append(publish_snapshot(category, json.dumps(result, ensure_ascii=False)))
+        except Exception as e:
+            conn.rollback()
+            telemetry.report_error('catalog-snapshot', e, stage='build', category=category)
+            failed.append({'category': category, 'error': f'{type(e).__name__}: {e}'})
+    return {'snapshots': built, 'failed': failed}
+
+def parse_if_none_match(event: dict) -> list:
+    '''Значения If-None-Match без кавычек и префикса W/'''
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'if-none-match'), '') or ''
+    return [tag.strip().removeprefix('W/').strip('"') for tag in value.split(',') if tag.strip()]
+
+def snapshot_response(event: dict):
+    '''Ответ GET из последнего снимка; None — запрос персональный, снимка нет или он устарел'''
+    category = snapshot_params(event.get('queryStringParameters') or {})
+    if category is None:
+        return None
+    
+    def load():
+        pointer = storage.get(f'{SNAPSHOT_PREFIX}/{snapshot_slug(category)}/latest.json')
+        if pointer is None:
+            # Отсутствие снимка тоже кешируется, чтобы неизвестная категория не читала бакет на каждый запрос
+            return {}
+        pointer = json.loads(pointer)
+        if SNAPSHOT_MODE == 'serve':
+            pointer['body'] = base64.b64encode(storage.get(pointer['key'])).decode('ascii')
+        return pointer
+    
+    try:
+        snapshot = snapshot_cache.get_or_load(snapshot_slug(category), load)
+    except Exception as e:
+        telemetry.report_error('catalog-snapshot', e, stage='read', category=category)
+        return None
+    if not snapshot or SNAPSHOT_MAX_AGE and time.time() - snapshot['built_at'] > SNAPSHOT_MAX_AGE:
+        return None
+    
+    headers = {
+        'ETag': f'"{snapshot["etag"]}"',
+        'Cache-Control': 'public, no-cache',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+    if snapshot['etag'] in parse_if_none_match(event):
+        return {'statusCode': 304, 'headers': headers, 'body': '', 'isBase64Encoded': False}
+    if SNAPSHOT_MODE == 'redirect':
+        return {'statusCode': 302, 'headers': {**headers, 'Location': snapshot['url']}, 'body': '', 'isBase64Encoded': False}
+    
+    headers['Content-Type'] = 'application/json'
+    accepted = compression.accepted_encodings(event)
+    if accepted.get('gzip', accepted.get('*', 0)) > 0:
+        return {
+            'statusCode': 200,
+            'headers': {**headers, 'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'},
+            'body': snapshot['body'],
+            'isBase64Encoded': True
+        }
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': gzip.decompress(base64.b64decode(snapshot['body'])).decode('utf-8'),
+        'isBase64Encoded': False
+    }
+
+# Прайс-лист: колонка файла -> тип в промежуточной таблице; sku — ключ товара у поставщика
+IMPORT_COLUMNS = {
+    'sku': 'text',
+    'name': 'text',
+    'description': 'text',
+    'category': 'text',
+    'subcategory': 'text',
+    'price': 'numeric',
+    'unit': 'text',
+    'image_url': 'text',
+    'in_stock': 'boolean',
+    'min_order_quantity': 'numeric',
+    'delivery_available': 'boolean',
+    'delivery_cost': 'numeric',
+    'delivery_days': 'integer',
+    'floor_lifting_cost': 'numeric',
+    'specifications': 'jsonb',
+}
+IMPORT_REQUIRED = ('sku', 'name', 'category', 'price', 'unit')
+# Пустое значение в файле — значение по умолчанию колонки supplier_products
+IMPORT_DEFAULTS = {
+    'in_stock': 'true',
+    'min_order_quantity': '1',
+    'delivery_available': 'true',
+    'delivery_cost': '0',
+    'delivery_days': '3',
+    'floor_lifting_cost': '0',
+}
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', '50000'))
+
+def price_list_csv(body: dict) -> tuple:
+    '''
+    Прайс-лист из тела запроса как CSV для COPY: (колонки, файл, число строк).
+    format=csv — строка data (разделитель «,», «;» или табуляция, первая строка — заголовок),
+    format=json — список объектов items. ValueError — некорректный прайс-лист.
+    '''
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if body.get('format', 'json') == 'csv':
+        data = body.get('data') or ''
+        try:
+            dialect = csv.Sniffer().sniff(data[:4096].partition('\n')[0], delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(io.StringIO(data), dialect)
+        columns = [c.strip().lower() for c in next(reader, [])]
+        rows = (row for row in reader if any(v.strip() for v in row))
+    else:
+        items = body.get('items')
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError('items must be a list of objects')
+        columns = list(dict.fromkeys(key for item in items for key in item))
+        rows = ([json.dumps(item[c], ensure_ascii=False) if isinstance(item.get(c), (dict, list))
+                 else item.get(c) for c in columns] for item in items)
+    
+    unknown = [c for c in columns if c not in IMPORT_COLUMNS]
+    missing = [c for c in IMPORT_REQUIRED if c not in columns]
+    if unknown or missing or len(set(columns)) != len(columns):
+        raise ValueError(f"Price list columns: unknown {unknown}, missing {missing}; allowed: {', '.join(IMPORT_COLUMNS)}")
+    
+    sku = columns.index('sku')
+    # В русских прайс-листах десятичная запятая и пробелы между разрядами: «1 250,50»
+    numeric = {i for i, c in enumerate(columns) if IMPORT_COLUMNS[c] in ('numeric', 'integer')}
+    count = 0
+    for row in rows:
+        count += 1
+        if count > IMPORT_MAX_ROWS:
+            raise ValueError(f'Price list has more than {IMPORT_MAX_ROWS} rows')
+        if len(row) != len(columns):
+            raise ValueError(f'Row {count}: expected {len(columns)} values, got {len(row)}')
+        row = [v.strip() if isinstance(v, str) else v for v in row]
+        if row[sku] in (None, ''):
+            raise ValueError(f'Row {count}: sku is empty')
+        for i in numeric:
+            if isinstance(row[i], str):
+                row[i] = row[i].replace('\xa0', '').replace(' ', '').replace(',', '.')
+        # Пустая строка — NULL для COPY
+        writer.writerow(['' if v is None or v == '' else v for v in row])
+    out.seek(0)
+    return columns, out, count
+
+def import_price_list(conn, cursor, supplier_id: int, columns: list, data) -> dict:
+    '''
+    Загрузка прайс-листа одной транзакцией: COPY во временную таблицу, затем один INSERT ... ON CONFLICT
+    по (supplier_id, sku). Обновляются только колонки из файла и только у изменившихся товаров.
+    При повторе артикула в файле берётся последняя строка.
+    '''
+    cursor.execute(
+        'CREATE TEMP TABLE price_list_staging (line bigint GENERATED ALWAYS AS IDENTITY, '
+        + ', '.join(f'{column} {kind}' for column, kind in IMPORT_COLUMNS.items())
+        + ') ON COMMIT DROP')
+    cursor.copy_expert(f"COPY price_list_staging ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", data)
+    
+    selected = [f'COALESCE(i.{c}, {IMPORT_DEFAULTS[c]})' if c in IMPORT_DEFAULTS else f'i.{c}' for c in columns]
+    updated = [c for c in columns if c != 'sku']
+    cursor.execute(f"""
+        WITH incoming AS (
+            SELECT DISTINCT ON (sku) * FROM price_list_staging ORDER BY sku, line DESC
+        ),
+        upserted AS (
+            INSERT INTO supplier_products AS p (supplier_id, {', '.join(columns)})
+            SELECT %(supplier_id)s, {', '.join(selected)} FROM incoming i
+            ON CONFLICT (supplier_id, sku) DO UPDATE
+            SET ({', '.join(updated)}, updated_at) = ({', '.join(f'EXCLUDED.{c}' for c in updated)}, CURRENT_TIMESTAMP)
+            WHERE ({', '.join(f'p.{c}' for c in updated)}) IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in updated)})
+            RETURNING xmax = 0 AS inserted, p.category
+        )
+        SELECT (SELECT COUNT(*) FROM price_list_staging),
+               (SELECT COUNT(*) FROM incoming),
+               COUNT(*) FILTER (WHERE inserted),
+               COUNT(*) FILTER (WHERE NOT inserted),
+               ARRAY(
+                   SELECT category FROM upserted
+                   UNION
+                   -- Категории поставщика до загрузки: товар мог из них уйти
+                   SELECT category FROM supplier_products WHERE supplier_id = %(supplier_id)s
+               )
+        FROM upserted
+    """, {'supplier_id': supplier_id})
+    rows, distinct, inserted, updated_count, categories = cursor.fetchone()
+    conn.commit()
+    return {
+        'rows': rows,
+        'duplicates': rows - distinct,
+        'inserted': inserted,
+        'updated': updated_count,
+        'unchanged': distinct - inserted - updated_count,
+        'categories': sorted(c for c in categories if c)
+    }
+
+BOM_MAX_PROJECTS = 50
+
+# Спецификация (bill of materials) сразу по нескольким проектам: строки, итоги по комнатам
+# и по поставщикам. Доставка берётся один раз на поставщика — самая дорогая из его строк,
+# подъём на этаж — по каждой строке. Проект без товаров получает пустые списки и нулевые итоги.
+BOM_SQL = """
+    WITH lines AS (
+        SELECT dpp.design_project_id,
+               dpp.id,
+               dpp.quantity,
+               dpp.room_name,
+               p.name AS product_name,
+               p.price,
+               p.unit,
+               COALESCE(p.delivery_cost, 0) AS delivery_cost,
+               COALESCE(p.floor_lifting_cost, 0) AS floor_lifting_cost,
+               s.id AS supplier_id,
+               s.company_name AS supplier_name,
+               dpp.quantity * p.price AS total
+        FROM design_project_products dpp
+        JOIN supplier_products p ON dpp.product_id = p.id
+        JOIN suppliers s ON p.supplier_id = s.id
+        WHERE dpp.design_project_id = ANY(%(project_ids)s)
+    ),
+    by_line AS (
+        SELECT design_project_id, jsonb_agg(to_jsonb(l) - 'design_project_id' ORDER BY l.room_name, l.id) AS items
+        FROM lines l
+        GROUP BY design_project_id
+    ),
+    by_room AS (
+        SELECT design_project_id,
+               jsonb_agg(jsonb_build_object(
+                   'room_name', room_name, 'lines', lines, 'products_total', products_total, 'lifting_total', lifting_total
+               ) ORDER BY room_name) AS rooms
+        FROM (
+            SELECT design_project_id, room_name, COUNT(*) AS lines,
+                   SUM(total) AS products_total, SUM(floor_lifting_cost) AS lifting_total
+            FROM lines
+            GROUP BY design_project_id, room_name
+        ) r
+        GROUP BY design_project_id
+    ),
+    by_supplier AS (
+        SELECT design_project_id,
+               jsonb_agg(jsonb_build_object(
+                   'supplier_id', supplier_id, 'supplier_name', supplier_name, 'lines', lines,
+                   'products_total', products_total, 'delivery_cost', delivery_cost, 'lifting_total', lifting_total
+               ) ORDER BY supplier_name) AS suppliers,
+               SUM(products_total) AS products_total,
+               SUM(delivery_cost) AS delivery_total,
+               SUM(lifting_total) AS lifting_total
+        FROM (
+            SELECT design_project_id, supplier_id, supplier_name, COUNT(*) AS lines,
+                   SUM(total) AS products_total, MAX(delivery_cost) AS delivery_cost, SUM(floor_lifting_cost) AS lifting_total
+            FROM lines
+            GROUP BY design_project_id, supplier_id, supplier_name
+        ) s
+        GROUP BY design_project_id
+    )
+    SELECT r.project_id AS design_project_id,
+           COALESCE(i.items, '[]') AS items,
+           COALESCE(rm.rooms, '[]') AS rooms,
+           COALESCE(s.suppliers, '[]') AS suppliers,
+           COALESCE(s.products_total, 0) AS "summary.products_total",
+           COALESCE(s.delivery_total, 0) AS "summary.delivery_total",
+           COALESCE(s.lifting_total, 0) AS "summary.lifting_total",
+           COALESCE(s.products_total + s.delivery_total + s.lifting_total, 0) AS "summary.grand_total"
+    FROM unnest(%(project_ids)s::int[]) WITH ORDINALITY AS r(project_id, position)
+    LEFT JOIN by_line i ON i.design_project_id = r.project_id
+    LEFT JOIN by_room rm ON rm.design_project_id = r.project_id
+    LEFT JOIN by_supplier s ON s.design_project_id = r.project_id
+    ORDER BY r.position
+"""
+
+def project_bom(cursor, project_ids: list) -> list:
+    '''Спецификации проектов в порядке project_ids, одним запросом'''
+    cursor.execute(BOM_SQL, {'project_ids': project_ids})
+    return encoder.rows(cursor)
+
+ADD_MAX_ITEMS = 500
+
+# Проверка пакета одним запросом: существует ли проект и каких товаров нет в каталоге
+ADD_CHECK_SQL = """
+    SELECT EXISTS (SELECT 1 FROM design_projects WHERE id = %(project_id)s),
+           ARRAY(
+               SELECT DISTINCT u.id FROM unnest(%(product_ids)s::int[]) AS u(id)
+               WHERE NOT EXISTS (SELECT 1 FROM supplier_products p WHERE p.id = u.id)
+               ORDER BY u.id
+           )
+"""
+
+# Все строки пакета одним INSERT из параллельных массивов
+ADD_INSERT_SQL = """
+    INSERT INTO design_project_products (design_project_id, product_id, quantity, room_name)
+    SELECT %(project_id)s, product_id, quantity, room_name
+    FROM unnest(%(product_ids)s::int[], %(quantities)s::numeric[], %(room_names)s::text[])
+         WITH ORDINALITY AS i(product_id, quantity, room_name, position)
+    ORDER BY position
+    RETURNING id
+"""
+
+def add_to_project(conn, cursor, project_id, items: list) -> tuple:
+    '''
+    Добавляет товары в дизайн-проект одной транзакцией и возвращает (id строк по порядку items,
+    обновлённая спецификация проекта). ValueError — некорректный пакет, проект или товары.
+    '''
+    if not isinstance(project_id, int) and not str(project_id).isdigit():
+        raise ValueError('project_id must be an integer')
+    if not isinstance(items, list) or not 0 < len(items) <= ADD_MAX_ITEMS:
+        raise ValueError(f'items must be a list of 1 to {ADD_MAX_ITEMS} products')
+    
+    product_ids, quantities, room_names = [], [], []
+    for n, item in enumerate(items, 1):
+        product_id = item.get('product_id') if isinstance(item, dict) else None
+        quantity = item.get('quantity', 1) if isinstance(item, dict) else None
+        if not isinstance(product_id, int) and not str(product_id).isdigit():
+            raise ValueError(f'Item {n}: product_id must be an integer')
+        try:
+            quantity = float(quantity)
+        except (TypeError, ValueError):
+            quantity = 0
+        if not quantity > 0:
+            raise ValueError(f'Item {n}: quantity must be a positive number')
+        product_ids.append(int(product_id))
+        quantities.append(quantity)
+        room_names.append(item.get('room_name'))
+    
+    values = {'project_id': int(project_id), 'product_ids': product_ids, 'quantities': quantities, 'room_names': room_names}
+    cursor.execute(ADD_CHECK_SQL, values)
+    project_exists, missing = cursor.fetchone()
+    if not project_exists:
+        raise ValueError(f'Design project {project_id} not found')
+    if missing:
+        raise ValueError(f"Products not found: {', '.join(map(str, missing))}")
+    
+    cursor.execute(ADD_INSERT_SQL, values)
+    # id из последовательности выдаются в порядке вставки, то есть в порядке items
+    item_ids = sorted(row[0] for row in cursor.fetchall())
+    project = project_bom(cursor, [int(project_id)])[0]
+    conn.commit()
+    return item_ids, project
+
+@telemetry.instrument
+@compression.negotiate
 def handler(event: dict, context) -> dict:
     '''API для работы с каталогом поставщиков и товаров'''
     
@@ -13,98 +766,57 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    if method == 'GET':
+        response = snapshot_response(event)
+        if response:
+            return response
+    
+    conn = cursor = None
     try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
+        # Пул исчерпан или БД недоступна — тот же ответ 500 с CORS, что и при ошибке запроса
+        conn = db.acquire()
         cursor = conn.cursor()
         
         if method == 'GET':
             params = event.get('queryStringParameters') or {}
-            category = params.get('category')
-            supplier_id = params.get('supplier_id')
-            search = params.get('search')
-            in_stock = params.get('in_stock', 'true') == 'true'
-            
-            query = '''
-                SELECT 
-                    p.id,
-                    p.name,
-                    p.description,
-                    p.category,
-                    p.subcategory,
-                    p.price,
-                    p.unit,
-                    p.image_url,
-                    p.in_stock,
-                    p.min_order_quantity,
-                    p.delivery_available,
-                    p.delivery_cost,
-                    p.delivery_days,
-                    p.floor_lifting_cost,
-                    p.specifications,
-                    s.id as supplier_id,
-                    s.company_name,
-                    s.rating,
-                    s.verified
-                FROM supplier_products p
-                JOIN suppliers s ON p.supplier_id = s.id
-                WHERE 1=1
-            '''
-            
-            if in_stock:
-                query += ' AND p.in_stock = true'
             
-            if category:
-                query += f" AND p.category = '{category}'"
-            
-            if supplier_id:
-                query += f" AND p.supplier_id = {supplier_id}"
-            
-            if search:
-                query += f" AND (p.name ILIKE '%{search}%' OR p.description ILIKE '%{search}%')"
-            
-            query += ' ORDER BY p.created_at DESC LIMIT 100'
-            
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            
-            products = []
-            for row in rows:
-                products.append({
-                    'id': row[0],
-                    'name': row[1],
-                    'description': row[2],
-                    'category': row[3],
-                    'subcategory': row[4],
-                    'price': float(row[5]) if row[5] else 0,
-                    'unit': row[6],
-                    'image_url': row[7],
-                    'in_stock': row[8],
-                    'min_order_quantity': float(row[9]) if row[9] else 1,
-                    'delivery_available': row[10],
-                    'delivery_cost': float(row[11]) if row[11] else 0,
-                    'delivery_days': row[12],
-                    'floor_lifting_cost': float(row[13]) if row[13] else 0,
-                    'specifications': row[14],
-                    'supplier': {
-                        'id': row[15],
-                        'name': row[16],
-                        'rating': float(row[17]) if row[17] else 0,
-                        'verified': row[18]
+            if params.get('since'):
+                try:
+                    limit = min(max(int(params.get('limit', MAX_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                    result = catalog_changes(cursor, params['since'], limit)
+                except (ValueError, TypeError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid limit or since cursor'}, ensure_ascii=False),
+                        'isBase64Encoded': False
                     }
-                })
-            
-            cursor.execute('SELECT DISTINCT category FROM supplier_products ORDER BY category')
-            categories = [r[0] for r in cursor.fetchall()]
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps(result, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
             
-            cursor.close()
-            conn.close()
+            try:
+                result = catalog_page(cursor, params)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
             
             return {
                 'statusCode': 200,
@@ -112,11 +824,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({
-                    'products': products,
-                    'categories': categories,
-                    'total': len(products)
-                }, ensure_ascii=False),
+                'body': json.dumps(result, ensure_ascii=False),
                 'isBase64Encoded': False
             }
         
@@ -124,12 +832,15 @@ def handler(event: dict, context) -> dict:
             body = json.loads(event.get('body', '{}'))
             product_id = body.get('id')
             
+            # Прежняя категория нужна, чтобы пересобрать и снимок, из которого товар ушёл
             cursor.execute('''
-                UPDATE supplier_products
+                UPDATE supplier_products p
                 SET name = %s, description = %s, category = %s, subcategory = %s,
                     price = %s, unit = %s, delivery_cost = %s, floor_lifting_cost = %s,
                     in_stock = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
+                FROM (SELECT id, category FROM supplier_products WHERE id = %s FOR UPDATE) old
+                WHERE p.id = old.id
+                RETURNING old.category, p.category
             ''', (
                 body.get('name'),
                 body.get('description'),
@@ -143,9 +854,10 @@ def handler(event: dict, context) -> dict:
                 product_id
             ))
             
+            categories = cursor.fetchone()
             conn.commit()
-            cursor.close()
-            conn.close()
+            if categories:
+                rebuild_snapshots(conn, cursor, categories)
             
             return {
                 'statusCode': 200,
@@ -153,7 +865,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'success': True, 'message': 'Товар обновлен'}),
+                'body': json.dumps({'success': True, 'message': 'Товар обновлен'}, ensure_ascii=False),
                 'isBase64Encoded': False
             }
         
@@ -165,14 +877,15 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Product ID required'}),
+                    'body': json.dumps({'error': 'Product ID required'}, ensure_ascii=False),
                     'isBase64Encoded': False
                 }
             
-            cursor.execute('UPDATE supplier_products SET in_stock = false WHERE id = %s', (product_id,))
+            cursor.execute('UPDATE supplier_products SET in_stock = false WHERE id = %s RETURNING category', (product_id,))
+            categories = cursor.fetchone()
             conn.commit()
-            cursor.close()
-            conn.close()
+            if categories:
+                rebuild_snapshots(conn, cursor, categories)
             
             return {
                 'statusCode': 200,
@@ -180,7 +893,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'success': True, 'message': 'Товар удален'}),
+                'body': json.dumps({'success': True, 'message': 'Товар удален'}, ensure_ascii=False),
                 'isBase64Encoded': False
             }
         
@@ -189,30 +902,66 @@ def handler(event: dict, context) -> dict:
             action = body.get('action')
             
             if action == 'add_to_project':
+                # items — пакет товаров [{product_id, quantity, room_name}]; без items — один товар, как раньше
                 project_id = body.get('project_id')
-                product_id = body.get('product_id')
-                quantity = body.get('quantity', 1)
-                room_name = body.get('room_name')
+                batch = 'items' in body
+                items = body['items'] if batch else [
+                    {'product_id': body.get('product_id'), 'quantity': body.get('quantity', 1), 'room_name': body.get('room_name')}]
+                try:
+                    item_ids, project = add_to_project(conn, cursor, project_id, items)
+                except ValueError as e:
+                    conn.rollback()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
                 
-                cursor.execute('''
-                    INSERT INTO design_project_products 
-                    (design_project_id, product_id, quantity, room_name)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                ''', (project_id, product_id, quantity, room_name))
+                result = {'success': True, 'project': project}
+                if batch:
+                    result['item_ids'] = item_ids
+                else:
+                    result['item_id'] = item_ids[0]
                 
-                item_id = cursor.fetchone()[0]
-                conn.commit()
-                cursor.close()
-                conn.close()
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps(result, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            elif action == 'import_price_list':
+                supplier_id = body.get('supplier_id')
+                try:
+                    if not isinstance(supplier_id, int) and not str(supplier_id).isdigit():
+                        raise ValueError('supplier_id must be an integer')
+                    columns, data, _ = price_list_csv(body)
+                    result = import_price_list(conn, cursor, int(supplier_id), columns, data)
+                except Exception as e:
+                    # 22xxx — неверное значение в файле, 23xxx — нарушение ограничения (неизвестный поставщик, NULL)
+                    if not isinstance(e, ValueError) and str(getattr(e, 'pgcode', None))[:2] not in ('22', '23'):
+                        raise
+                    conn.rollback()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e).strip()}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
                 
+                if result['inserted'] or result['updated']:
+                    rebuild_snapshots(conn, cursor, result['categories'])
                 return {
                     'statusCode': 200,
                     'headers': {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({'success': True, 'item_id': item_id}),
+                    'body': json.dumps({'success': True, **result}, ensure_ascii=False),
                     'isBase64Encoded': False
                 }
             
@@ -238,8 +987,7 @@ def handler(event: dict, context) -> dict:
                 
                 product_id = cursor.fetchone()[0]
                 conn.commit()
-                cursor.close()
-                conn.close()
+                rebuild_snapshots(conn, cursor, [body.get('category')])
                 
                 return {
                     'statusCode': 200,
@@ -247,62 +995,39 @@ def handler(event: dict, context) -> dict:
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({'success': True, 'product_id': product_id}),
+                    'body': json.dumps({'success': True, 'product_id': product_id}, ensure_ascii=False),
                     'isBase64Encoded': False
                 }
             
-            elif action == 'get_project_products':
-                project_id = body.get('project_id')
+            elif action == 'rebuild_snapshots':
+                cursor.execute('SELECT DISTINCT category FROM supplier_products WHERE in_stock')
+                categories = [row[0] for row in cursor.fetchall()]
+                result = rebuild_snapshots(conn, cursor, categories)
                 
-                cursor.execute('''
-                    SELECT 
-                        dpp.id,
-                        dpp.quantity,
-                        dpp.room_name,
-                        p.name,
-                        p.price,
-                        p.unit,
-                        p.delivery_cost,
-                        p.floor_lifting_cost,
-                        s.company_name
-                    FROM design_project_products dpp
-                    JOIN supplier_products p ON dpp.product_id = p.id
-                    JOIN suppliers s ON p.supplier_id = s.id
-                    WHERE dpp.design_project_id = %s
-                ''', (project_id,))
-                
-                rows = cursor.fetchall()
-                items = []
-                total_cost = 0
-                total_delivery = 0
-                total_lifting = 0
-                
-                for row in rows:
-                    quantity = float(row[1])
-                    price = float(row[4])
-                    delivery = float(row[6]) if row[6] else 0
-                    lifting = float(row[7]) if row[7] else 0
-                    
-                    item_total = quantity * price
-                    total_cost += item_total
-                    total_delivery += delivery
-                    total_lifting += lifting
-                    
-                    items.append({
-                        'id': row[0],
-                        'quantity': quantity,
-                        'room_name': row[2],
-                        'product_name': row[3],
-                        'price': price,
-                        'unit': row[5],
-                        'delivery_cost': delivery,
-                        'floor_lifting_cost': lifting,
-                        'supplier_name': row[8],
-                        'total': item_total
-                    })
+                # 500, если хоть одна категория не пересобралась, чтобы вызов по расписанию это заметил
+                return {
+                    'statusCode': 500 if result['failed'] else 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'success': not result['failed'], **result}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            elif action == 'get_project_products':
+                # project_ids — несколько вариантов проекта за один вызов; project_id — прежний формат ответа
+                ids = body.get('project_ids', [body.get('project_id')])
+                if (not isinstance(ids, list) or not 0 < len(ids) <= BOM_MAX_PROJECTS
+                        or not all(isinstance(i, int) or str(i).isdigit() for i in ids)):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'project_id or project_ids (up to {BOM_MAX_PROJECTS} integers) required'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
                 
-                cursor.close()
-                conn.close()
+                projects = project_bom(cursor, [int(i) for i in ids])
                 
                 return {
                     'statusCode': 200,
@@ -310,38 +1035,36 @@ def handler(event: dict, context) -> dict:
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({
-                        'items': items,
-                        'summary': {
-                            'products_total': total_cost,
-                            'delivery_total': total_delivery,
-                            'lifting_total': total_lifting,
-                            'grand_total': total_cost + total_delivery + total_lifting
-                        }
-                    }, ensure_ascii=False),
+                    'body': json.dumps(
+                        {'projects': projects} if 'project_ids' in body else projects[0],
+                        ensure_ascii=False),
                     'isBase64Encoded': False
                 }
         
-        cursor.close()
-        conn.close()
-        
         return {
             'statusCode': 405,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': json.dumps({'error': 'Method not allowed'}, ensure_ascii=False),
             'isBase64Encoded': False
         }
         
     except Exception as e:
+        if conn:
+            conn.rollback()
         return {
             'statusCode': 500,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': str(e)}),
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            db.release(conn)
@@ -0,0 +1,100 @@
+'''
+Объектное хранилище (S3-совместимый бакет poehali.dev).
+boto3 импортируется и клиент создаётся при первой записи, а не при загрузке функции:
+запросы, которым бакет не нужен, не платят за импорт SDK на холодном старте.
+При STORAGE_LOCAL_DIR объекты пишутся в локальный каталог вместо бакета (разработка и бенчмарки).
+'''
+import os
+import shutil
+import threading
+
+import telemetry
+
+ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://bucket.poehali.dev')
+BUCKET = os.environ.get('S3_BUCKET', 'files')
+LOCAL_DIR = os.environ.get('STORAGE_LOCAL_DIR', '')
+
+_lock = threading.Lock()
+_client = None
+
+
+def client():
+    '''S3-клиент контейнера, создаётся один раз'''
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import boto3
+                _client = boto3.client(
+                    's3',
+                    endpoint_url=ENDPOINT_URL,
+                    aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+                    aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+                )
+    return _client
+
+
+def _local_path(key: str) -> str:
+    path = os.path.join(LOCAL_DIR, *key.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def cdn_url(key: str) -> str:
+    '''Публичная ссылка на объект через CDN'''
+    if LOCAL_DIR:
+        return 'file://' + os.path.abspath(os.path.join(LOCAL_DIR, *key.split('/')))
+    return f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{key}"
+
+
+def signed_url(key: str, expires_in: int = 3600) -> str:
+    '''Временная ссылка на закрытый объект (выгрузки с персональными данными)'''
+    if LOCAL_DIR:
+        return cdn_url(key)
+    return client().generate_presigned_url(
+        'get_object', Params={'Bucket': BUCKET, 'Key': key}, ExpiresIn=expires_in)
+
+
+def put(key: str, body: bytes, content_type: str, content_encoding: str = None, cache_control: str = None) -> str:
+    '''Кладёт объект в бакет и возвращает его CDN-ссылку'''
+    if LOCAL_DIR:
+        with open(_local_path(key), 'wb') as f:
+            f.write(body)
+        return cdn_url(key)
+    extra = {}
+    if content_encoding:
+        extra['ContentEncoding'] = content_encoding
+    if cache_control:
+        extra['CacheControl'] = cache_control
+    s3 = client()
+    with telemetry.external('s3'):
+        s3.put_object(Bucket=BUCKET, Key=key, Body=body, ContentType=content_type, **extra)
+    return cdn_url(key)
+
+
+def get(key: str):
+    '''Содержимое объекта или None, если его нет'''
+    if LOCAL_DIR:
+        try:
+            with open(os.path.join(LOCAL_DIR, *key.split('/')), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    s3 = client()
+    with telemetry.external('s3'):
+        try:
+            return s3.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+        except s3.exceptions.NoSuchKey:
+            return None
+
+
+def put_file(key: str, fileobj, content_type: str):
+    '''Загружает открытый файл частями (multipart), не читая его в память целиком'''
+    fileobj.seek(0)
+    if LOCAL_DIR:
+        with open(_local_path(key), 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+        return
+    s3 = client()
+    with telemetry.external('s3'):
+        s3.upload_fileobj(fileobj, BUCKET, key, ExtraArgs={'ContentType': content_type})
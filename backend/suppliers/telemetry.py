@@ -0,0 +1,204 @@
+'''
+Телеметрия вызовов функции: одна JSON-строка лога на запрос
+и агрегаты по тёплому контейнеру, доступные через GET ?action=metrics при METRICS_ENABLED=1.
+'''
+import collections
+import functools
+import json
+import math
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+try:
+    import db
+except ImportError:
+    db = None
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+WINDOW = int(os.environ.get('METRICS_WINDOW', '500'))
+LOG_ENABLED = os.environ.get('TELEMETRY_LOG', '1') != '0'
+
+_lock = threading.Lock()
+_local = threading.local()
+_cold = True
+_container_started = time.time()
+_durations = collections.deque(maxlen=WINDOW)
+_totals = {
+    'invocations': 0,
+    'cold_starts': 0,
+    'errors': 0,
+    'duration_ms': 0.0,
+    'sql_count': 0,
+    'sql_ms': 0.0,
+    'response_bytes': 0,
+}
+_http = {}
+_reported = {}
+_providers = {}
+
+
+@contextmanager
+def external(service: str):
+    '''Замер исходящего вызова (polza, smsru, telegram, s3, ...) в рамках текущего запроса'''
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        calls = getattr(_local, 'http', None)
+        if calls is not None:
+            calls[service] = calls.get(service, 0.0) + elapsed_ms
+        with _lock:
+            stat = _http.setdefault(service, {'calls': 0, 'ms': 0.0})
+            stat['calls'] += 1
+            stat['ms'] += elapsed_ms
+
+
+def report_error(source: str, error: BaseException, **context):
+    '''Ошибка, которую функция обработала и не вернула клиенту: JSON-строка лога с трейсбеком и счётчик по source'''
+    with _lock:
+        _reported[source] = _reported.get(source, 0) + 1
+    print(json.dumps({
+        'type': 'error',
+        'source': source,
+        'function': os.environ.get('FUNCTION_NAME'),
+        'request_id': getattr(_local, 'request_id', None),
+        **context,
+        'error': f'{type(error).__name__}: {error}',
+        'traceback': ''.join(traceback.format_exception(type(error), error, error.__traceback__)),
+    }, ensure_ascii=False, default=str))
+
+
+def register_stats(name: str, provider):
+    '''Дополнительный раздел ответа ?action=metrics; provider — функция без аргументов, возвращающая dict'''
+    _providers[name] = provider
+
+
+def _response_bytes(response) -> int:
+    body = response.get('body') if isinstance(response, dict) else None
+    if isinstance(body, str) and response.get('isBase64Encoded'):
+        return len(body) * 3 // 4 - body[-2:].count('=')
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return 0
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values), math.ceil(len(values) * pct / 100)) - 1)
+    return round(values[rank], 2)
+
+
+def snapshot() -> dict:
+    '''Агрегаты с момента старта контейнера'''
+    with _lock:
+        totals = dict(_totals)
+        durations = sorted(_durations)
+        http = {k: {'calls': v['calls'], 'ms': round(v['ms'], 2)} for k, v in _http.items()}
+        reported = dict(_reported)
+    invocations = totals['invocations'] or 1
+    result = {
+        'uptime_s': round(time.time() - _container_started, 1),
+        'invocations': totals['invocations'],
+        'cold_starts': totals['cold_starts'],
+        'errors': totals['errors'],
+        'duration_ms': {
+            'avg': round(totals['duration_ms'] / invocations, 2),
+            'p50': _percentile(durations, 50),
+            'p95': _percentile(durations, 95),
+            'p99': _percentile(durations, 99),
+        },
+        'sql': {
+            'avg_count': round(totals['sql_count'] / invocations, 2),
+            'avg_ms': round(totals['sql_ms'] / invocations, 2),
+        },
+        'http': http,
+        'reported_errors': reported,
+        'response_bytes': {
+            'avg': round(totals['response_bytes'] / invocations),
+            'total': totals['response_bytes'],
+        },
+    }
+    for name, provider in _providers.items():
+        result[name] = provider()
+    return result
+
+
+def _metrics_response(event: dict) -> dict:
+    headers = event.get('headers') or {}
+    if METRICS_TOKEN and headers.get('X-Metrics-Token', headers.get('x-metrics-token')) != METRICS_TOKEN:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unauthorized'}, ensure_ascii=False)
+        }
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'metrics': snapshot()}, ensure_ascii=False)
+    }
+
+
+def _record(entry: dict):
+    with _lock:
+        _totals['invocations'] += 1
+        _totals['cold_starts'] += int(entry['cold'])
+        _totals['errors'] += int(entry['status'] >= 500)
+        _totals['duration_ms'] += entry['duration_ms']
+        _totals['sql_count'] += entry['sql_count']
+        _totals['sql_ms'] += entry['sql_ms']
+        _totals['response_bytes'] += entry['response_bytes']
+        _durations.append(entry['duration_ms'])
+    if LOG_ENABLED:
+        print(json.dumps(entry, ensure_ascii=False))
+
+
+def instrument(handler):
+    '''Оборачивает handler облачной функции: замеры на каждый запрос и эндпоинт ?action=metrics'''
+
+    @functools.wraps(handler)
+    def wrapper(event: dict, context) -> dict:
+        global _cold
+        method = event.get('httpMethod', 'GET')
+        params = event.get('queryStringParameters') or {}
+        if METRICS_ENABLED and method == 'GET' and params.get('action') == 'metrics':
+            return _metrics_response(event)
+
+        with _lock:
+            cold, _cold = _cold, False
+
+        _local.http = {}
+        _local.request_id = getattr(context, 'request_id', None)
+        sql_before = db.query_stats() if db else (0, 0.0)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = handler(event, context)
+            return response
+        finally:
+            sql_after = db.query_stats() if db else (0, 0.0)
+            _record({
+                'type': 'invocation',
+                'function': getattr(context, 'function_name', None) or os.environ.get('FUNCTION_NAME'),
+                'request_id': getattr(context, 'request_id', None),
+                'method': method,
+                'action': params.get('action'),
+                'status': response.get('statusCode', 200) if isinstance(response, dict) else 500,
+                'cold': cold,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                'sql_count': sql_after[0] - sql_before[0],
+                'sql_ms': round((sql_after[1] - sql_before[1]) * 1000, 2),
+                'http_ms': {k: round(v, 2) for k, v in _local.http.items()},
+                'response_bytes': _response_bytes(response),
+            })
+            _local.http = None
+            _local.request_id = None
+
+    return wrapper
@@ -0,0 +1,70 @@
+'''
+Преобразование строк результата SQL в JSON-совместимые dict.
+По cursor.description один раз на набор колонок компилируется функция строки:
+numeric -> float, date/time -> ISO-строка, колонки с точкой в имени ("supplier.id") -> вложенный объект.
+'''
+import threading
+
+# OID типов PostgreSQL, которым нужна конвертация
+_NUMERIC = (1700,)
+_TEMPORAL = (1082, 1083, 1114, 1184, 1266)
+
+_MAX_PLANS = 512
+_plans = {}
+_lock = threading.Lock()
+
+
+def _column_expr(index: int, type_code: int) -> str:
+    value = f'r[{index}]'
+    if type_code in _NUMERIC:
+        return f'(None if {value} is None else float({value}))'
+    if type_code in _TEMPORAL:
+        return f'(None if {value} is None else {value}.isoformat())'
+    return value
+
+
+def _compile(description) -> callable:
+    '''Собирает lambda r: {...} с литералом dict под конкретный набор колонок'''
+    fields = {}
+    for index, column in enumerate(description):
+        top, _, sub = column.name.partition('.')
+        expr = _column_expr(index, column.type_code)
+        if sub:
+            fields.setdefault(top, {})[sub] = expr
+        else:
+            fields[top] = expr
+
+    def literal(items: dict) -> str:
+        parts = []
+        for key, expr in items.items():
+            parts.append(f'{key!r}: {literal(expr) if isinstance(expr, dict) else expr}')
+        return '{' + ', '.join(parts) + '}'
+
+    return eval(f'lambda r: {literal(fields)}', {})
+
+
+def row_encoder(description) -> callable:
+    '''Функция строки для данного cursor.description (кешируется по именам и типам колонок)'''
+    key = tuple((column.name, column.type_code) for column in description)
+    encode = _plans.get(key)
+    if encode is None:
+        encode = _compile(description)
+        with _lock:
+            if len(_plans) >= _MAX_PLANS:
+                _plans.clear()
+            _plans[key] = encode
+    return encode
+
+
+def rows(cursor) -> list:
+    '''Все строки результата как список dict'''
+    encode = row_encoder(cursor.description)
+    return list(map(encode, cursor.fetchall()))
+
+
+def row(cursor):
+    '''Одна строка результата как dict или None'''
+    record = cursor.fetchone()
+    if record is None:
+        return None
+    return row_encoder(cursor.description)(record)
@@ -2,9 +2,13 @@ import json
 import os
 import base64
 from datetime import datetime
-import requests
-import psycopg2
 
+import db
+import encoder
+import storage
+import telemetry
+
+@telemetry.instrument
 def handler(event: dict, context) -> dict:
     '''
     ИИ-агент ЯСЕН для голосового общения с заказчиками и исполнителями.
@@ -44,7 +48,7 @@ def handler(event: dict, context) -> dict:
     return {
         'statusCode': 400,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Invalid action or method'})
+        'body': json.dumps({'error': 'Invalid action or method'}, ensure_ascii=False)
     }
 
 def handle_transcribe(event: dict) -> dict:
@@ -62,12 +66,15 @@ def handle_transcribe(event: dict) -> dict:
         if not api_key:
             return error_response('API key not configured', 500)
         
-        response = requests.post(
-            'https://api.polza.ai/v1/audio/transcriptions',
-            headers={'Authorization': f'Bearer {api_key}'},
-            files={'file': ('audio.webm', audio_bytes, 'audio/webm')},
-            data={'model': 'whisper-1', 'language': 'ru'}
-        )
+        import requests
+        
+        with telemetry.external('polza'):
+            response = requests.post(
+                'https://api.polza.ai/v1/audio/transcriptions',
+                headers={'Authorization': f'Bearer {api_key}'},
+                files={'file': ('audio.webm', audio_bytes, 'audio/webm')},
+                data={'model': 'whisper-1', 'language': 'ru'}
+            )
         
         if response.status_code != 200:
             return error_response(f'Transcription failed: {response.text}', 500)
@@ -80,7 +87,7 @@ def handle_transcribe(event: dict) -> dict:
             'body': json.dumps({
                 'success': True,
                 'text': result.get('text', '')
-            })
+            }, ensure_ascii=False)
         }
     except Exception as e:
         return error_response(str(e), 500)
@@ -106,19 +113,22 @@ def handle_chat(event: dict) -> dict:
         messages.extend(conversation_history)
         messages.append({'role': 'user', 'content': user_message})
         
-        response = requests.post(
-            'https://api.polza.ai/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'openai/gpt-4o',
-                'messages': messages,
-                'temperature': 0.7,
-                'max_tokens': 1000
-            }
-        )
+        import requests
+        
+        with telemetry.external('polza'):
+            response = requests.post(
+                'https://api.polza.ai/v1/chat/completions',
+                headers={
+                    'Authorization': f'Bearer {api_key}',
+                    'Content-Type': 'application/json'
+                },
+                json={
+                    'model': 'openai/gpt-4o',
+                    'messages': messages,
+                    'temperature': 0.7,
+                    'max_tokens': 1000
+                }
+            )
         
         if response.status_code not in [200, 201]:
             return error_response(f'Chat API error: {response.status_code}', 500)
@@ -137,7 +147,7 @@ def handle_chat(event: dict) -> dict:
                 'success': True,
                 'message': assistant_message,
                 'usage': result.get('usage', {})
-            })
+            }, ensure_ascii=False)
         }
     except Exception as e:
         return error_response(str(e), 500)
@@ -156,20 +166,17 @@ def handle_create_order(event: dict) -> dict:
         if not all([customer_phone, work_description]):
             return error_response('Missing required fields', 400)
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute('''
-            INSERT INTO work_orders 
-            (customer_phone, contractor_phone, work_description, price, deadline, conversation_id, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, 'pending', NOW())
-            RETURNING id, created_at
-        ''', (customer_phone, contractor_phone, work_description, price, deadline, conversation_id))
-        
-        order_id, created_at = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute('''
+                    INSERT INTO work_orders 
+                    (customer_phone, contractor_phone, work_description, price, deadline, conversation_id, status, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, 'pending', NOW())
+                    RETURNING id, created_at
+                ''', (customer_phone, contractor_phone, work_description, price, deadline, conversation_id))
+                
+                order_id, created_at = cur.fetchone()
+            conn.commit()
         
         if contractor_phone:
             send_order_notification(order_id, contractor_phone, work_description, price, deadline)
@@ -182,7 +189,7 @@ def handle_create_order(event: dict) -> dict:
                 'order_id': order_id,
                 'created_at': created_at.isoformat(),
                 'notification_sent': bool(contractor_phone)
-            })
+            }, ensure_ascii=False)
         }
     except Exception as e:
         return error_response(str(e), 500)
@@ -199,40 +206,21 @@ def handle_save_recording(event: dict) -> dict:
         if not audio_base64:
             return error_response('Audio data required', 400)
         
-        import boto3
-        
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
-        )
-        
         audio_bytes = base64.b64decode(audio_base64)
         file_key = f'recordings/{conversation_id}_{datetime.now().timestamp()}.webm'
-        
-        s3.put_object(
-            Bucket='files',
-            Key=file_key,
-            Body=audio_bytes,
-            ContentType='audio/webm'
-        )
-        
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{file_key}"
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute('''
-            INSERT INTO conversation_recordings 
-            (conversation_id, audio_url, duration, participants, created_at)
-            VALUES (%s, %s, %s, %s, NOW())
-            RETURNING id
-        ''', (conversation_id, cdn_url, duration, json.dumps(participants)))
-        
-        recording_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
+        cdn_url = storage.put(file_key, audio_bytes, 'audio/webm')
+        
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute('''
+                    INSERT INTO conversation_recordings 
+                    (conversation_id, audio_url, duration, participants, created_at)
+                    VALUES (%s, %s, %s, %s, NOW())
+                    RETURNING id
+                ''', (conversation_id, cdn_url, duration, json.dumps(participants, ensure_ascii=False)))
+                
+                recording_id = cur.fetchone()[0]
+            conn.commit()
         
         return {
             'statusCode': 200,
@@ -241,7 +229,7 @@ def handle_save_recording(event: dict) -> dict:
                 'success': True,
                 'recording_id': recording_id,
                 'audio_url': cdn_url
-            })
+            }, ensure_ascii=False)
         }
     except Exception as e:
         return error_response(str(e), 500)
@@ -253,9 +241,6 @@ def get_orders(event: dict) -> dict:
         status = params.get('status')
         limit = int(params.get('limit', 50))
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
         query = 'SELECT id, customer_phone, contractor_phone, work_description, price, deadline, status, created_at FROM work_orders'
         
         if status:
@@ -263,28 +248,15 @@ def get_orders(event: dict) -> dict:
         
         query += f' ORDER BY created_at DESC LIMIT {limit}'
         
-        cur.execute(query)
-        orders = []
-        
-        for row in cur.fetchall():
-            orders.append({
-                'id': row[0],
-                'customer_phone': row[1],
-                'contractor_phone': row[2],
-                'work_description': row[3],
-                'price': float(row[4]) if row[4] else None,
-                'deadline': row[5].isoformat() if row[5] else None,
-                'status': row[6],
-                'created_at': row[7].isoformat()
-            })
-        
-        cur.close()
-        conn.close()
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query)
+                orders = encoder.rows(cur)
         
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True, 'orders': orders})
+            'body': json.dumps({'success': True, 'orders': orders}, ensure_ascii=False)
         }
     except Exception as e:
         return error_response(str(e), 500)
@@ -296,41 +268,29 @@ def get_recordings(event: dict) -> dict:
         conversation_id = params.get('conversation_id')
         limit = int(params.get('limit', 50))
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        if conversation_id:
-            cur.execute('''
-                SELECT id, conversation_id, audio_url, duration, participants, created_at 
-                FROM conversation_recordings 
-                WHERE conversation_id = %s
-                ORDER BY created_at DESC
-            ''', (conversation_id,))
-        else:
-            cur.execute(f'''
-                SELECT id, conversation_id, audio_url, duration, participants, created_at 
-                FROM conversation_recordings 
-                ORDER BY created_at DESC LIMIT {limit}
-            ''')
-        
-        recordings = []
-        for row in cur.fetchall():
-            recordings.append({
-                'id': row[0],
-                'conversation_id': row[1],
-                'audio_url': row[2],
-                'duration': row[3],
-                'participants': json.loads(row[4]) if row[4] else [],
-                'created_at': row[5].isoformat()
-            })
-        
-        cur.close()
-        conn.close()
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                if conversation_id:
+                    cur.execute('''
+                        SELECT id, conversation_id, audio_url, duration,
+                               COALESCE(NULLIF(participants, '')::json, '[]'::json) AS participants, created_at 
+                        FROM conversation_recordings 
+                        WHERE conversation_id = %s
+                        ORDER BY created_at DESC
+                    ''', (conversation_id,))
+                else:
+                    cur.execute(f'''
+                        SELECT id, conversation_id, audio_url, duration,
+                               COALESCE(NULLIF(participants, '')::json, '[]'::json) AS participants, created_at 
+                        FROM conversation_recordings 
+                        ORDER BY created_at DESC LIMIT {limit}
+                    ''')
+                recordings = encoder.rows(cur)
         
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True, 'recordings': recordings})
+            'body': json.dumps({'success': True, 'recordings': recordings}, ensure_ascii=False)
         }
     except Exception as e:
         return error_response(str(e), 500)
@@ -368,30 +328,29 @@ def send_order_notification(order_id: int, phone: str, work_description: str, pr
     try:
         notification_url = 'https://functions.poehali.dev/d6486f4d-19a8-4e90-b7c9-704773186863'
         
-        requests.post(
-            notification_url,
-            json={
-                'action': 'send',
-                'type': 'both',
-                'phone': phone,
-                'order_id': order_id,
-                'work_description': work_description,
-                'price': price,
-                'deadline': deadline
-            },
-            timeout=5
-        )
+        import requests
+        
+        with telemetry.external('notifications'):
+            requests.post(
+                notification_url,
+                json={
+                    'action': 'send',
+                    'type': 'both',
+                    'phone': phone,
+                    'order_id': order_id,
+                    'work_description': work_description,
+                    'price': price,
+                    'deadline': deadline
+                },
+                timeout=5
+            )
     except Exception as e:
         print(f'Notification failed: {e}')
 
-def get_db_connection():
-    '''Подключение к PostgreSQL'''
-    return psycopg2.connect(os.environ['DATABASE_URL'])
-
 def error_response(message: str, status_code: int = 500) -> dict:
     '''Формирование ответа с ошибкой'''
     return {
         'statusCode': status_code,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'success': False, 'error': message})
+        'body': json.dumps({'success': False, 'error': message}, ensure_ascii=False)
     }
\ No newline at end of file
@@ -0,0 +1,236 @@
+'''
+Нагрузочный бенчмарк облачных функций: вызывает handler(event, context) прямо в процессе
+на сценариях из backend/<функция>/tests.json и тяжёлых вариантах из bench/cases.json.
+
+    python bench/run.py --database-url postgresql://localhost/remont --concurrency 8
+    python bench/run.py --database-url ... --skip-seed --save-baseline
+'''
+import argparse
+import concurrent.futures
+import importlib.util
+import itertools
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+CASES_FILE = os.path.join(BENCH_DIR, 'cases.json')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# Функции, которым для ответа нужны только Postgres и S3; остальные ходят во внешние API
+DEFAULT_FUNCTIONS = ['projects', 'measurements', 'photos', 'auth', 'admin-stats', 'suppliers', 'yasen-agent']
+
+
+class BenchContext:
+    function_name = 'bench'
+    request_id = 'bench'
+
+
+def load_cases(function: str) -> list:
+    '''Сценарии функции: tests.json плюс тяжёлые варианты с раскрытием matrix'''
+    cases = []
+    tests_path = os.path.join(BACKEND_DIR, function, 'tests.json')
+    if os.path.exists(tests_path):
+        with open(tests_path, encoding='utf-8') as f:
+            cases.extend(json.load(f).get('tests', []))
+
+    with open(CASES_FILE, encoding='utf-8') as f:
+        heavy = json.load(f).get(function, [])
+    for case in heavy:
+        matrix = case.get('matrix')
+        if not matrix:
+            cases.append(case)
+            continue
+        keys = sorted(matrix)
+        for values in itertools.product(*(matrix[k] for k in keys)):
+            params = dict(zip(keys, values))
+            variant = _fill(case, params)
+            variant['name'] = f"{case['name']} [{', '.join(f'{k}={v}' for k, v in params.items())}]"
+            cases.append(variant)
+    return cases
+
+
+def _fill(value, params: dict):
+    '''Подстановка параметров matrix в строки сценария'''
+    if isinstance(value, str):
+        return value.format(**params)
+    if isinstance(value, list):
+        return [_fill(v, params) for v in value]
+    if isinstance(value, dict):
+        return {k: _fill(v, params) for k, v in value.items() if k != 'matrix'}
+    return value
+
+
+def build_event(case: dict) -> dict:
+    parts = urlsplit(case.get('path', '/'))
+    body = case.get('body')
+    return {
+        'httpMethod': case.get('method', 'GET'),
+        'path': parts.path or '/',
+        'queryStringParameters': dict(parse_qsl(parts.query)),
+        'headers': dict(case.get('headers', {})),
+        'body': json.dumps(body, ensure_ascii=False) if body is not None else '',
+        'isBase64Encoded': False,
+    }
+
+
+@contextmanager
+def function_modules(function: str):
+    '''
+    Загружает index.py функции так же, как в её собственном контейнере:
+    папка функции первой в sys.path, а её локальные модули (db.py и др.) не смешиваются с модулями других функций.
+    '''
+    function_dir = os.path.join(BACKEND_DIR, function)
+    local = {n[:-3] for n in os.listdir(function_dir) if n.endswith('.py')}
+    for name in local:
+        sys.modules.pop(name, None)
+    sys.path.insert(0, function_dir)
+    try:
+        spec = importlib.util.spec_from_file_location('index', os.path.join(function_dir, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['index'] = module
+        spec.loader.exec_module(module)
+        yield module, sys.modules.get('db')
+    finally:
+        sys.path.remove(function_dir)
+        for name in local:
+            sys.modules.pop(name, None)
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+def run_case(handler, db_module, case: dict, requests_count: int, concurrency: int, warmup: int) -> dict:
+    expected = case.get('expectedStatus')
+
+    def call(_):
+        event = build_event(case)
+        queries_before = db_module.query_stats()[0] if db_module else 0
+        started = time.perf_counter()
+        response = handler(event, BenchContext())
+        elapsed = time.perf_counter() - started
+        queries = (db_module.query_stats()[0] - queries_before) if db_module else 0
+        ok = expected is None or response.get('statusCode') == expected
+        return elapsed, queries, ok
+
+    for i in range(warmup):
+        call(i)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(call, range(requests_count)))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    return {
+        'requests': requests_count,
+        'errors': sum(1 for r in results if not r[2]),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'rps': round(requests_count / wall, 1) if wall else 0.0,
+        'queries_per_request': round(sum(r[1] for r in results) / requests_count, 2),
+    }
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    '''Регрессии относительно сохранённого baseline: рост p95 сверх допуска или рост числа запросов к БД'''
+    problems = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + max_regression):
+            problems.append(f"{key}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries_per_request'] > previous['queries_per_request']:
+            problems.append(f"{key}: queries/request {previous['queries_per_request']} -> {current['queries_per_request']}")
+        if current['errors'] > previous.get('errors', 0):
+            problems.append(f"{key}: errors {previous.get('errors', 0)} -> {current['errors']}")
+    return problems
+
+
+def print_report(results: dict):
+    header = f"{'case':<70} {'req':>5} {'err':>4} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>8} {'q/req':>6}"
+    print(header)
+    print('-' * len(header))
+    for key, r in results.items():
+        print(f"{key[:70]:<70} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['rps']:>8.1f} {r['queries_per_request']:>6.2f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Latency benchmark for backend functions')
+    parser.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL'), required='BENCH_DATABASE_URL' not in os.environ)
+    parser.add_argument('--functions', default=','.join(DEFAULT_FUNCTIONS))
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--scale', type=int, default=1, help='multiplier for seeded data volume')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the already seeded schema')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='allowed relative p95 growth')
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BENCH_DIR)
+    import seed
+
+    if not args.skip_seed:
+        print(f'Seeding schema {seed.SCHEMA} (scale={args.scale})...')
+        seed.prepare(args.database_url, args.scale)
+    os.environ['DATABASE_URL'] = seed.bench_dsn(args.database_url)
+    os.environ.setdefault('TELEMETRY_LOG', '0')
+    # Загрузки и выгрузки пишутся в локальный каталог вместо бакета
+    os.environ.setdefault('STORAGE_LOCAL_DIR', os.path.join(tempfile.gettempdir(), 'remont-bench-storage'))
+    # Кейсы admin-stats замеряют запросы к БД, а не кеш ответов
+    os.environ.setdefault('ADMIN_STATS_CACHE', '0')
+    # и каталог suppliers — тоже запросы, а не снимки из бакета
+    os.environ.setdefault('CATALOG_SNAPSHOTS', 'off')
+    # как и projects?project_id= — запрос карточки проекта, а не попадание в кеш cache.py
+    os.environ.setdefault('CACHE_ENABLED', '0')
+
+    results = {}
+    for function in [f.strip() for f in args.functions.split(',') if f.strip()]:
+        with function_modules(function) as (module, db_module):
+            for case in load_cases(function):
+                key = f"{function}::{case['name']}"
+                results[key] = run_case(module.handler, db_module, case, args.requests, args.concurrency, args.warmup)
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args.max_regression)
+        if problems:
+            print('\nRegressions against baseline:')
+            for problem in problems:
+                print(f'  {problem}')
+            return 1
+        print('\nNo regressions against baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+'''
+Подготовка локальной базы для бенчмарков: схема из db_migrations/ и объёмные тестовые данные.
+'''
+import os
+import re
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_DIR = os.path.join(ROOT, 'db_migrations')
+SCHEMA = 't_p46588937_remont_plus_app'
+
+SEED_SQL = '''
+INSERT INTO users (phone, name, email, user_type, specialization, experience, is_verified, created_at)
+SELECT '+7900' || lpad(g::text, 7, '0'),
+       'Пользователь ' || g,
+       'user' || g || '@example.com',
+       CASE WHEN g %% 5 = 0 THEN 'contractor' ELSE 'customer' END,
+       CASE WHEN g %% 5 = 0 THEN 'Отделочные работы' END,
+       CASE WHEN g %% 5 = 0 THEN g %% 20 END,
+       g %% 2 = 0,
+       NOW() - (g || ' minutes')::interval
+FROM generate_series(1, %(users)s) g;
+
+INSERT INTO projects (user_id, title, address, project_type, area, rooms, budget, description, status, progress, created_at)
+SELECT CASE WHEN g <= %(heavy_projects)s THEN 1 ELSE 1 + g %% %(users)s END,
+       'Объект ' || g,
+       'Самара, ул. Ленина, д. ' || g,
+       (ARRAY['apartment', 'house', 'office', 'commercial'])[1 + g %% 4],
+       40 + g %% 200,
+       1 + g %% 5,
+       500000 + (g %% 100) * 10000,
+       'Капитальный ремонт, объект ' || g,
+       (ARRAY['draft', 'measurement', 'design', 'estimate', 'in_progress', 'completed', 'cancelled'])[1 + g %% 7],
+       g %% 101,
+       NOW() - (g || ' minutes')::interval
+FROM generate_series(1, %(projects)s) g;
+
+INSERT INTO room_measurements (project_id, room_name, length, width, height, area, notes)
+SELECT CASE WHEN g <= %(heavy_children)s THEN 1 ELSE 1 + g %% %(projects)s END,
+       'Комната ' || g, 4.2, 3.5, 2.7, 14.7, 'Замер ' || g
+FROM generate_series(1, %(measurements)s) g;
+
+INSERT INTO project_photos (project_id, photo_url, room_name, description)
+SELECT CASE WHEN g <= %(heavy_children)s THEN 1 ELSE 1 + g %% %(projects)s END,
+       'https://cdn.example.com/photos/' || g || '.jpg', 'Комната ' || g, 'Фото ' || g
+FROM generate_series(1, %(photos)s) g;
+
+INSERT INTO supplier_products (supplier_id, name, description, category, subcategory, price, unit,
+                               in_stock, delivery_cost, delivery_days, floor_lifting_cost, specifications)
+SELECT 1 + g %% 3,
+       (ARRAY['Ламинат', 'Плитка', 'Краска', 'Обои', 'Грунтовка', 'Штукатурка'])[1 + g %% 6] || ' артикул ' || g,
+       'Материал для отделки, партия ' || g,
+       (ARRAY['Напольные покрытия', 'Стройматериалы', 'Краски', 'Обои', 'Мебель', 'Освещение'])[1 + g %% 6],
+       'Подкатегория ' || (g %% 12),
+       100 + (g %% 5000),
+       'шт',
+       g %% 10 <> 0,
+       (g %% 7) * 100,
+       1 + g %% 10,
+       (g %% 5) * 50,
+       jsonb_build_object('class', (31 + g %% 4)::text, 'thickness', (6 + g %% 8) || 'мм')
+FROM generate_series(1, %(products)s) g;
+
+INSERT INTO design_projects (user_id, name, room_type, style, area, budget)
+VALUES (1, 'Квартира на Ленина', 'apartment', 'modern', 64, 1500000);
+
+INSERT INTO design_project_products (design_project_id, product_id, quantity, room_name)
+SELECT 1, 1 + g %% %(products)s, 1 + g %% 10, 'Комната ' || (g %% 4)
+FROM generate_series(1, %(design_items)s) g;
+
+INSERT INTO work_orders (customer_phone, contractor_phone, work_description, price, status, created_at)
+SELECT '+7900' || lpad((1 + g %% %(users)s)::text, 7, '0'), '+7911' || lpad(g::text, 7, '0'),
+       'Наряд на отделочные работы №' || g, 10000 + g %% 90000,
+       (ARRAY['pending', 'accepted', 'completed'])[1 + g %% 3],
+       NOW() - (g || ' minutes')::interval
+FROM generate_series(1, %(orders)s) g;
+
+-- Дневные агрегаты для admin-stats?action=timeseries: GET читает только их
+SELECT stats_rollup();
+
+ANALYZE;
+'''
+
+
+def sizes(scale: int) -> dict:
+    '''Объёмы данных; пользователь 1 и проект 1 — «тяжёлые» для проверки худших случаев'''
+    return {
+        'users': 2000 * scale,
+        'projects': 20000 * scale,
+        'heavy_projects': 500 * scale,
+        'measurements': 60000 * scale,
+        'photos': 60000 * scale,
+        'heavy_children': 50,
+        'products': 20000 * scale,
+        'design_items': 200,
+        'orders': 10000 * scale,
+    }
+
+
+def migration_files() -> list:
+    names = [n for n in os.listdir(MIGRATIONS_DIR) if re.match(r'^V\d+__.+\.sql$', n)]
+    return [os.path.join(MIGRATIONS_DIR, n) for n in sorted(names)]
+
+
+def bench_dsn(database_url: str) -> str:
+    '''DSN, под которым функции видят таблицы бенчмарка без указания схемы'''
+    return psycopg2.extensions.make_dsn(database_url, options=f'-c search_path={SCHEMA}')
+
+
+def prepare(database_url: str, scale: int = 1):
+    '''Пересоздаёт схему, применяет миграции по порядку и заливает тестовые данные'''
+    conn = psycopg2.connect(bench_dsn(database_url))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+            cur.execute(f'CREATE SCHEMA {SCHEMA}')
+            cur.execute(f'SET search_path TO {SCHEMA}')
+            for path in migration_files():
+                with open(path, encoding='utf-8') as f:
+                    cur.execute(f.read())
+            cur.execute(SEED_SQL, sizes(scale))
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,211 @@
+'''
+Бенчмарк холодного старта: каждая функция загружается в свежем интерпретаторе,
+как в новом контейнере, и замеряются время импорта index.py и латентность первого запроса.
+
+    python bench/startup.py --save-baseline
+    python bench/startup.py --runs 7
+    python bench/startup.py --database-url postgresql://localhost/remont_bench
+
+Без --database-url первым запросом идёт OPTIONS (базе и внешним API он не нужен),
+с --database-url — первый GET-сценарий из tests.json функции против схемы бенчмарка.
+'''
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'startup_baseline.json')
+
+# SDK, которые не должны загружаться при импорте index.py: только на том пути кода, где они нужны
+HEAVY_MODULES = ('boto3', 'botocore', 'requests', 'urllib3', 'psycopg2')
+
+
+class BenchContext:
+    function_name = 'bench-startup'
+    request_id = 'bench-startup'
+
+
+def discover_functions() -> list:
+    '''Все папки backend/ с index.py, включая расширения'''
+    functions = []
+    for path, dirs, files in os.walk(BACKEND_DIR):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('.', '__')))
+        if 'index.py' in files:
+            functions.append(os.path.relpath(path, BACKEND_DIR).replace(os.sep, '/'))
+    return sorted(functions)
+
+
+def first_event(function: str, with_database: bool) -> dict:
+    if with_database:
+        tests_path = os.path.join(BACKEND_DIR, function, 'tests.json')
+        if os.path.exists(tests_path):
+            with open(tests_path, encoding='utf-8') as f:
+                for case in json.load(f).get('tests', []):
+                    if case.get('method', 'GET') == 'GET':
+                        parts = urlsplit(case.get('path', '/'))
+                        return {
+                            'httpMethod': 'GET',
+                            'path': parts.path or '/',
+                            'queryStringParameters': dict(parse_qsl(parts.query)),
+                            'headers': dict(case.get('headers', {})),
+                            'body': '',
+                            'isBase64Encoded': False,
+                        }
+    return {
+        'httpMethod': 'OPTIONS',
+        'path': '/',
+        'queryStringParameters': {},
+        'headers': {'Origin': 'http://localhost'},
+        'body': '',
+        'isBase64Encoded': False,
+    }
+
+
+def probe(function: str, event: dict) -> dict:
+    '''Выполняется в дочернем процессе: импорт index.py и один вызов handler'''
+    function_dir = os.path.join(BACKEND_DIR, function)
+    sys.path.insert(0, function_dir)
+    before = set(sys.modules)
+
+    started = time.perf_counter()
+    spec = importlib.util.spec_from_file_location('index', os.path.join(function_dir, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['index'] = module
+    spec.loader.exec_module(module)
+    import_ms = (time.perf_counter() - started) * 1000
+    loaded_at_import = set(sys.modules) - before
+
+    started = time.perf_counter()
+    response = module.handler(event, BenchContext())
+    first_request_ms = (time.perf_counter() - started) * 1000
+    loaded_at_request = set(sys.modules) - before - loaded_at_import
+
+    def heavy(names):
+        return sorted({n.split('.')[0] for n in names if n.split('.')[0] in HEAVY_MODULES})
+
+    return {
+        'import_ms': round(import_ms, 3),
+        'first_request_ms': round(first_request_ms, 3),
+        'status': response.get('statusCode') if isinstance(response, dict) else None,
+        'modules_at_import': len(loaded_at_import),
+        'heavy_at_import': heavy(loaded_at_import),
+        'heavy_at_first_request': heavy(loaded_at_request),
+    }
+
+
+def measure(function: str, event: dict, runs: int) -> dict:
+    '''Медиана по нескольким холодным запускам функции'''
+    samples = []
+    env = dict(os.environ, TELEMETRY_LOG='0')
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__),
+             '--probe', function, '--event', json.dumps(event)],
+            capture_output=True, text=True, env=env, cwd=ROOT
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f'{function}: probe failed\n{completed.stderr}')
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    last = samples[-1]
+    return {
+        'runs': runs,
+        'import_ms': round(statistics.median(s['import_ms'] for s in samples), 3),
+        'first_request_ms': round(statistics.median(s['first_request_ms'] for s in samples), 3),
+        'method': event['httpMethod'],
+        'status': last['status'],
+        'modules_at_import': last['modules_at_import'],
+        'heavy_at_import': last['heavy_at_import'],
+        'heavy_at_first_request': last['heavy_at_first_request'],
+    }
+
+
+def compare(results: dict, baseline: dict, max_regression: float, slack_ms: float) -> list:
+    '''Проблемы холодного старта: тяжёлые SDK при импорте и рост времени сверх допуска'''
+    problems = []
+    for function, current in results.items():
+        if current['heavy_at_import']:
+            problems.append(f"{function}: heavy modules imported at load: {', '.join(current['heavy_at_import'])}")
+        previous = baseline.get(function)
+        if not previous or previous.get('method') != current['method']:
+            continue
+        for metric in ('import_ms', 'first_request_ms'):
+            limit = previous[metric] * (1 + max_regression) + slack_ms
+            if current[metric] > limit:
+                problems.append(f'{function}: {metric} {previous[metric]} -> {current[metric]} (limit {limit:.1f})')
+    return problems
+
+
+def print_report(results: dict):
+    header = f"{'function':<32} {'req':>7} {'import':>9} {'first':>9} {'mods':>5}  heavy at first request"
+    print(header)
+    print('-' * len(header))
+    for function, r in results.items():
+        print(f"{function[:32]:<32} {r['method']:>7} {r['import_ms']:>9.2f} {r['first_request_ms']:>9.2f} "
+              f"{r['modules_at_import']:>5}  {', '.join(r['heavy_at_first_request']) or '-'}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Cold start benchmark for backend functions')
+    parser.add_argument('--functions', help='comma separated, default: every backend function')
+    parser.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL'),
+                        help='run the first GET case from tests.json against the seeded bench schema')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--max-regression', type=float, default=0.5, help='allowed relative growth')
+    parser.add_argument('--slack-ms', type=float, default=5.0, help='absolute allowance on top of the relative one')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--probe', help=argparse.SUPPRESS)
+    parser.add_argument('--event', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        print(json.dumps(probe(args.probe, json.loads(args.event))))
+        return 0
+
+    if args.database_url:
+        sys.path.insert(0, BENCH_DIR)
+        import seed
+        os.environ['DATABASE_URL'] = seed.bench_dsn(args.database_url)
+
+    functions = [f.strip() for f in args.functions.split(',')] if args.functions else discover_functions()
+    results = {}
+    for function in functions:
+        results[function] = measure(function, first_event(function, bool(args.database_url)), args.runs)
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    problems = compare(results, baseline, args.max_regression, args.slack_ms)
+    if problems:
+        print('\nCold start problems:')
+        for problem in problems:
+            print(f'  {problem}')
+        return 1
+    print('\nCold start within budget.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+-- Постраничный список проектов пользователя: WHERE user_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_projects_user_created ON projects(user_id, created_at DESC, id DESC);
+
+-- Составной индекс покрывает поиск по user_id, отдельный индекс больше не нужен
+DROP INDEX IF EXISTS idx_projects_user_id;
@@ -0,0 +1,121 @@
+-- Счётчики панели администратора: одна строка на метрику, поддерживаются триггерами
+CREATE TABLE IF NOT EXISTS admin_stats_summary (
+    metric VARCHAR(100) PRIMARY KEY,
+    value NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE admin_stats_summary IS 'Счётчики admin-stats?action=stats, обновляются триггерами на users, projects, room_measurements и project_photos';
+
+-- Вклад одной строки таблицы в счётчики; строки с metric IS NULL пропускаются
+CREATE OR REPLACE FUNCTION admin_stats_user_metrics(user_type TEXT)
+RETURNS TABLE (metric TEXT, amount NUMERIC) AS $$
+    VALUES ('users.total', 1::numeric),
+           ('users.' || user_type, 1::numeric)
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION admin_stats_project_metrics(status TEXT, project_type TEXT, budget NUMERIC)
+RETURNS TABLE (metric TEXT, amount NUMERIC) AS $$
+    VALUES ('projects.total', 1::numeric),
+           ('projects.status.' || status, 1::numeric),
+           ('projects.type.' || project_type, 1::numeric),
+           ('projects.budget_sum', COALESCE(budget, 0)),
+           ('projects.budget_count', CASE WHEN budget IS NULL THEN 0 ELSE 1 END::numeric)
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION admin_stats_measurement_metrics()
+RETURNS TABLE (metric TEXT, amount NUMERIC) AS $$
+    VALUES ('content.measurements', 1::numeric)
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION admin_stats_photo_metrics()
+RETURNS TABLE (metric TEXT, amount NUMERIC) AS $$
+    VALUES ('content.photos', 1::numeric)
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Триггер уровня оператора: изменённые строки из таблиц переходов сворачиваются в дельты по метрикам
+-- одним INSERT ... ON CONFLICT. TG_ARGV[0] — функция метрик, TG_ARGV[1] — её аргументы (колонки таблицы).
+-- Метрики обновляются по порядку имён, чтобы параллельные транзакции не ловили взаимную блокировку.
+CREATE OR REPLACE FUNCTION admin_stats_track() RETURNS trigger AS $$
+DECLARE
+    columns TEXT := COALESCE(TG_ARGV[1], '');
+    selected TEXT := CASE WHEN columns = '' THEN '' ELSE ', ' || columns END;
+    changes TEXT;
+BEGIN
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN format('SELECT 1 AS sign%s FROM new_rows', selected)
+        WHEN 'DELETE' THEN format('SELECT -1 AS sign%s FROM old_rows', selected)
+        ELSE format('SELECT 1 AS sign%1$s FROM new_rows UNION ALL SELECT -1%1$s FROM old_rows', selected)
+    END;
+    EXECUTE format(
+        'INSERT INTO admin_stats_summary AS s (metric, value)
+         SELECT m.metric, SUM(c.sign * m.amount)
+         FROM (%s) c, LATERAL %I(%s) m
+         WHERE m.metric IS NOT NULL
+         GROUP BY m.metric
+         HAVING SUM(c.sign * m.amount) <> 0
+         ORDER BY m.metric
+         ON CONFLICT (metric) DO UPDATE SET value = s.value + EXCLUDED.value, updated_at = CURRENT_TIMESTAMP',
+        changes, TG_ARGV[0], columns);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+-- Таблицы переходов нельзя объявить у триггера на несколько событий, поэтому по триггеру на событие
+CREATE TRIGGER admin_stats_users_insert AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_user_metrics', 'user_type');
+CREATE TRIGGER admin_stats_users_update AFTER UPDATE ON users
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_user_metrics', 'user_type');
+CREATE TRIGGER admin_stats_users_delete AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_user_metrics', 'user_type');
+
+CREATE TRIGGER admin_stats_projects_insert AFTER INSERT ON projects
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_project_metrics', 'status, project_type, budget');
+CREATE TRIGGER admin_stats_projects_update AFTER UPDATE ON projects
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_project_metrics', 'status, project_type, budget');
+CREATE TRIGGER admin_stats_projects_delete AFTER DELETE ON projects
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_project_metrics', 'status, project_type, budget');
+
+CREATE TRIGGER admin_stats_measurements_insert AFTER INSERT ON room_measurements
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_measurement_metrics', '');
+CREATE TRIGGER admin_stats_measurements_delete AFTER DELETE ON room_measurements
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_measurement_metrics', '');
+
+CREATE TRIGGER admin_stats_photos_insert AFTER INSERT ON project_photos
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_photo_metrics', '');
+CREATE TRIGGER admin_stats_photos_delete AFTER DELETE ON project_photos
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION admin_stats_track('admin_stats_photo_metrics', '');
+
+-- Точный пересчёт: заполняет таблицу при миграции и исправляет расхождения (admin-stats POST ?action=recount).
+-- EXCLUSIVE-блокировка ждёт транзакции, уже обновившие счётчики, и задерживает новые до конца пересчёта.
+CREATE OR REPLACE FUNCTION admin_stats_recount() RETURNS void AS $$
+BEGIN
+    LOCK TABLE admin_stats_summary IN EXCLUSIVE MODE;
+    DELETE FROM admin_stats_summary;
+    INSERT INTO admin_stats_summary (metric, value)
+    SELECT m.metric, SUM(m.amount)
+    FROM (
+        SELECT x.* FROM users r, LATERAL admin_stats_user_metrics(r.user_type) x
+        UNION ALL
+        SELECT x.* FROM projects r, LATERAL admin_stats_project_metrics(r.status, r.project_type, r.budget) x
+        UNION ALL
+        SELECT 'content.measurements', COUNT(*) FROM room_measurements
+        UNION ALL
+        SELECT 'content.photos', COUNT(*) FROM project_photos
+    ) m
+    WHERE m.metric IS NOT NULL
+    GROUP BY m.metric;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+SELECT admin_stats_recount();
@@ -0,0 +1,11 @@
+-- Список проектов в админке: ORDER BY created_at DESC, id DESC с курсором (created_at, id) < (?, ?)
+CREATE INDEX IF NOT EXISTS idx_projects_created ON projects(created_at DESC, id DESC);
+
+-- То же с фильтром по статусу; составной индекс заменяет idx_projects_status
+CREATE INDEX IF NOT EXISTS idx_projects_status_created ON projects(status, created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_projects_status;
+
+-- Фильтр по типу объекта
+CREATE INDEX IF NOT EXISTS idx_projects_type_created ON projects(project_type, created_at DESC, id DESC);
+
+-- JOIN users u ON p.user_id = u.id для страницы проектов идёт вложенным циклом по первичному ключу users
@@ -0,0 +1,103 @@
+-- История смены статусов проектов: источник для дневных переходов между статусами
+CREATE TABLE IF NOT EXISTS project_status_log (
+    id SERIAL PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    from_status VARCHAR(50),
+    to_status VARCHAR(50),
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_project_status_log_changed_at ON project_status_log(changed_at);
+
+CREATE OR REPLACE FUNCTION project_status_log_track() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO project_status_log (project_id, from_status, to_status) VALUES (NEW.id, OLD.status, NEW.status);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+CREATE TRIGGER project_status_log_update AFTER UPDATE OF status ON projects
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION project_status_log_track();
+
+-- Дневные агрегаты: одна строка на метрику, значение измерения (тип, статус, переход) и день
+CREATE TABLE IF NOT EXISTS stats_daily (
+    metric VARCHAR(50) NOT NULL,
+    dimension VARCHAR(120) NOT NULL DEFAULT '',
+    day DATE NOT NULL,
+    value BIGINT NOT NULL,
+    PRIMARY KEY (metric, day, dimension)
+);
+
+-- Водяной знак: с какого дня метрику нужно пересчитать при следующем запуске
+CREATE TABLE IF NOT EXISTS stats_rollup_state (
+    metric VARCHAR(50) PRIMARY KEY,
+    watermark DATE NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE stats_daily IS 'Дневные агрегаты для admin-stats?action=timeseries, пересчитываются stats_rollup() от водяного знака';
+COMMENT ON TABLE stats_rollup_state IS 'Водяные знаки stats_rollup() по метрикам';
+
+-- Диапазоны по дате создания для пересчёта последних дней
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
+CREATE INDEX IF NOT EXISTS idx_room_measurements_created_at ON room_measurements(created_at);
+CREATE INDEX IF NOT EXISTS idx_project_photos_created_at ON project_photos(created_at);
+CREATE INDEX IF NOT EXISTS idx_work_orders_created_at ON work_orders(created_at);
+
+-- Инкрементальный пересчёт: для каждой метрики дни начиная с водяного знака удаляются и считаются заново
+-- из строк с created_at >= водяного знака, после чего знак сдвигается на (сейчас - settle)::date.
+-- Текущий день остаётся открытым и пересчитывается при следующем запуске; settle покрывает транзакции,
+-- которые закоммитили строки с created_at прошлых суток уже после полуночи.
+-- max_age: не пересчитывать, если все метрики обновлялись не раньше max_age назад.
+-- Параллельный запуск пропускается по advisory-блокировке. Возвращает число записанных строк.
+CREATE OR REPLACE FUNCTION stats_rollup(max_age INTERVAL DEFAULT NULL, settle INTERVAL DEFAULT '10 minutes')
+RETURNS INTEGER AS $$
+DECLARE
+    source RECORD;
+    since DATE;
+    written INTEGER;
+    total INTEGER := 0;
+BEGIN
+    IF max_age IS NOT NULL AND (
+        SELECT COUNT(*) = 6 AND MIN(updated_at) > LOCALTIMESTAMP - max_age FROM stats_rollup_state
+    ) THEN
+        RETURN 0;
+    END IF;
+    IF NOT pg_try_advisory_xact_lock(hashtext('stats_rollup')) THEN
+        RETURN 0;
+    END IF;
+
+    FOR source IN SELECT * FROM (VALUES
+        ('users.new', 'users', 'created_at', 'user_type'),
+        ('projects.new', 'projects', 'created_at', 'project_type'),
+        ('projects.status_transitions', 'project_status_log', 'changed_at', $q$COALESCE(from_status, '') || '>' || COALESCE(to_status, '')$q$),
+        ('measurements.new', 'room_measurements', 'created_at', $q$''$q$),
+        ('photos.new', 'project_photos', 'created_at', $q$''$q$),
+        ('work_orders.new', 'work_orders', 'created_at', 'status')
+    ) AS s(metric, source_table, time_column, dimension)
+    LOOP
+        SELECT watermark INTO since FROM stats_rollup_state WHERE metric = source.metric;
+        since := COALESCE(since, DATE '1970-01-01');
+
+        DELETE FROM stats_daily WHERE metric = source.metric AND day >= since;
+        EXECUTE format(
+            'INSERT INTO stats_daily (metric, dimension, day, value)
+             SELECT %L, COALESCE(%s, %L), %I::date, COUNT(*)
+             FROM %I
+             WHERE %I >= $1
+             GROUP BY 2, 3',
+            source.metric, source.dimension, '', source.time_column, source.source_table, source.time_column)
+        USING since;
+        GET DIAGNOSTICS written = ROW_COUNT;
+        total := total + written;
+
+        INSERT INTO stats_rollup_state AS s (metric, watermark, updated_at)
+        VALUES (source.metric, GREATEST(since, (LOCALTIMESTAMP - settle)::date), LOCALTIMESTAMP)
+        ON CONFLICT (metric) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = EXCLUDED.updated_at;
+    END LOOP;
+    RETURN total;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+SELECT stats_rollup();
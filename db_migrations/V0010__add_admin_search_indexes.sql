@@ -0,0 +1,18 @@
+-- Поиск администратора (admin-stats?action=search): подстроки по триграммам, слова — полнотекстом
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Триграммы: ILIKE '%фрагмент%' и word_similarity по телефону, имени, email, названию, адресу и тексту заказа
+CREATE INDEX IF NOT EXISTS idx_users_phone_trgm ON users USING GIN (phone gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_name_trgm ON users USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm ON users USING GIN (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_projects_title_trgm ON projects USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_projects_address_trgm ON projects USING GIN (address gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_work_orders_description_trgm ON work_orders USING GIN (work_description gin_trgm_ops);
+
+-- Полнотекстовые индексы с русской морфологией; выражения должны совпадать с запросами в admin-stats
+CREATE INDEX IF NOT EXISTS idx_users_name_fts ON users
+    USING GIN (to_tsvector('russian', name));
+CREATE INDEX IF NOT EXISTS idx_projects_fts ON projects
+    USING GIN (to_tsvector('russian', title || ' ' || address));
+CREATE INDEX IF NOT EXISTS idx_work_orders_description_fts ON work_orders
+    USING GIN (to_tsvector('russian', work_description));
@@ -0,0 +1,15 @@
+-- Поиск по каталогу поставщиков: полнотекстовый с русской морфологией и триграммный для опечаток и артикулов
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Вес A — название, B — подкатегория, C — описание; колонка пересчитывается самой БД при INSERT/UPDATE
+ALTER TABLE supplier_products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', COALESCE(name, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(subcategory, '')), 'B') ||
+        setweight(to_tsvector('russian', COALESCE(description, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_supplier_products_search ON supplier_products USING GIN (search_vector);
+
+-- Триграммы названия: word_similarity (<%) для опечаток и ILIKE для части артикула
+CREATE INDEX IF NOT EXISTS idx_supplier_products_name_trgm ON supplier_products USING GIN (name gin_trgm_ops);
@@ -0,0 +1,40 @@
+-- Сортировки каталога с пагинацией по курсору: у каждой свой индекс (ключ, id)
+
+-- Рейтинг поставщика копируется в товар, чтобы сортировка по нему шла по индексу без соединения
+ALTER TABLE supplier_products ADD COLUMN IF NOT EXISTS supplier_rating DECIMAL(3,2) NOT NULL DEFAULT 0;
+
+UPDATE supplier_products p SET supplier_rating = COALESCE(s.rating, 0)
+FROM suppliers s
+WHERE s.id = p.supplier_id AND p.supplier_rating <> COALESCE(s.rating, 0);
+
+CREATE OR REPLACE FUNCTION supplier_products_set_rating() RETURNS trigger AS $$
+BEGIN
+    NEW.supplier_rating := COALESCE((SELECT rating FROM suppliers WHERE id = NEW.supplier_id), 0);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+CREATE TRIGGER supplier_products_rating BEFORE INSERT OR UPDATE OF supplier_id ON supplier_products
+    FOR EACH ROW EXECUTE FUNCTION supplier_products_set_rating();
+
+CREATE OR REPLACE FUNCTION suppliers_propagate_rating() RETURNS trigger AS $$
+BEGIN
+    UPDATE supplier_products SET supplier_rating = COALESCE(NEW.rating, 0) WHERE supplier_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+CREATE TRIGGER suppliers_rating_update AFTER UPDATE OF rating ON suppliers
+    FOR EACH ROW WHEN (OLD.rating IS DISTINCT FROM NEW.rating)
+    EXECUTE FUNCTION suppliers_propagate_rating();
+
+-- Ключ курсора не может быть NULL: срок доставки по умолчанию — 3 дня, как в DEFAULT колонки
+UPDATE supplier_products SET delivery_days = 3 WHERE delivery_days IS NULL;
+ALTER TABLE supplier_products ALTER COLUMN delivery_days SET NOT NULL;
+
+-- Каталог по умолчанию показывает товары в наличии, поэтому индексы частичные.
+-- B-tree читается в обе стороны: (price, id) обслуживает и price, и price_desc
+CREATE INDEX IF NOT EXISTS idx_supplier_products_newest ON supplier_products(created_at, id) WHERE in_stock;
+CREATE INDEX IF NOT EXISTS idx_supplier_products_price ON supplier_products(price, id) WHERE in_stock;
+CREATE INDEX IF NOT EXISTS idx_supplier_products_rating ON supplier_products(supplier_rating, id) WHERE in_stock;
+CREATE INDEX IF NOT EXISTS idx_supplier_products_delivery ON supplier_products(delivery_days, id) WHERE in_stock;
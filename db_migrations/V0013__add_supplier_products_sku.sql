@@ -0,0 +1,5 @@
+-- Артикул поставщика: ключ загрузки прайс-листов (suppliers POST action=import_price_list)
+ALTER TABLE supplier_products ADD COLUMN IF NOT EXISTS sku VARCHAR(100);
+
+-- Товары без артикула (добавленные вручную) не мешают друг другу: NULL в уникальном индексе не совпадают
+CREATE UNIQUE INDEX IF NOT EXISTS idx_supplier_products_supplier_sku ON supplier_products(supplier_id, sku);
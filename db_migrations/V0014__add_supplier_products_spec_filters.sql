@@ -0,0 +1,16 @@
+-- Фильтры каталога по характеристикам (suppliers GET spec.<ключ>=...)
+
+-- Совпадение spec.class=33 -> specifications @> '{"class": "33"}': jsonb_path_ops компактнее и поддерживает только @>
+CREATE INDEX IF NOT EXISTS idx_supplier_products_specifications ON supplier_products
+    USING GIN (specifications jsonb_path_ops);
+
+-- Число в начале значения характеристики: '12 мм' -> 12, '0,5' -> 0.5, нет числа -> NULL.
+-- Диапазоны spec.thickness>=8 сравнивают spec_number(specifications ->> ключ)
+CREATE OR REPLACE FUNCTION spec_number(value TEXT) RETURNS NUMERIC AS $$
+    SELECT replace(substring(value FROM '^\s*(-?[0-9]+(?:[.,][0-9]+)?)'), ',', '.')::numeric
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Индекс по выражению для частого ключа диапазонов (толщина ламината и паркета);
+-- выражение должно совпадать с запросом в suppliers
+CREATE INDEX IF NOT EXISTS idx_supplier_products_spec_thickness ON supplier_products
+    (spec_number(specifications ->> 'thickness'));
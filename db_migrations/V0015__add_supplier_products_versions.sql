@@ -0,0 +1,35 @@
+-- Лента изменений каталога (suppliers GET ?since=<курсор>): каждая вставка и изменение товара,
+-- включая снятие с продажи, получает следующий номер версии из последовательности
+CREATE SEQUENCE IF NOT EXISTS supplier_products_version_seq;
+
+ALTER TABLE supplier_products ADD COLUMN IF NOT EXISTS version BIGINT;
+
+UPDATE supplier_products p SET version = v.version
+FROM (SELECT id, row_number() OVER (ORDER BY updated_at, id) AS version FROM supplier_products) v
+WHERE v.id = p.id AND p.version IS NULL;
+
+SELECT setval('supplier_products_version_seq', GREATEST((SELECT MAX(version) FROM supplier_products), 0) + 1, false);
+
+UPDATE supplier_products SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+
+ALTER TABLE supplier_products
+    ALTER COLUMN version SET DEFAULT nextval('supplier_products_version_seq'),
+    ALTER COLUMN version SET NOT NULL,
+    ALTER COLUMN updated_at SET NOT NULL;
+
+-- Версию и время ставит БД, поэтому изменения из любого запроса (PUT, DELETE, загрузка прайс-листа,
+-- смена рейтинга поставщика) попадают в ленту. updated_at — момент записи строки, а не начала транзакции:
+-- по нему suppliers откладывает выдачу версий, транзакции с которыми могут быть ещё не закоммичены
+CREATE OR REPLACE FUNCTION supplier_products_set_version() RETURNS trigger AS $$
+BEGIN
+    NEW.version := nextval('supplier_products_version_seq');
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+CREATE TRIGGER supplier_products_version BEFORE INSERT OR UPDATE ON supplier_products
+    FOR EACH ROW EXECUTE FUNCTION supplier_products_set_version();
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_supplier_products_version ON supplier_products(version);
+CREATE INDEX IF NOT EXISTS idx_supplier_products_updated_at ON supplier_products(updated_at);
@@ -0,0 +1,7 @@
+-- Поиск администратора по телефону: номера хранятся с форматированием (+7 (912) 345-67-89),
+-- поэтому цифры запроса сравниваются с цифрами номера. Выражение должно совпадать с запросом в admin-stats
+CREATE INDEX IF NOT EXISTS idx_users_phone_digits_trgm ON users
+    USING GIN (regexp_replace(phone, '[^0-9]', '', 'g') gin_trgm_ops);
+
+-- Триграммы по исходному phone поиск больше не использует
+DROP INDEX IF EXISTS idx_users_phone_trgm;
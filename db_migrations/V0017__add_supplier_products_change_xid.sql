@@ -0,0 +1,20 @@
+-- Лента изменений каталога по транзакциям: версия из последовательности берётся до коммита,
+-- и более поздняя версия может стать видимой раньше более ранней. Номер транзакции последней записи
+-- позволяет отдавать только завершённые транзакции (младше xmin снимка) — см. suppliers catalog_changes()
+ALTER TABLE supplier_products ADD COLUMN IF NOT EXISTS change_xid BIGINT;
+
+CREATE OR REPLACE FUNCTION supplier_products_set_version() RETURNS trigger AS $$
+BEGIN
+    NEW.version := nextval('supplier_products_version_seq');
+    NEW.updated_at := clock_timestamp();
+    NEW.change_xid := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+-- Существующие строки получают номер транзакции миграции через тот же триггер
+UPDATE supplier_products SET change_xid = 0 WHERE change_xid IS NULL;
+
+ALTER TABLE supplier_products ALTER COLUMN change_xid SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_supplier_products_change ON supplier_products(change_xid, id);
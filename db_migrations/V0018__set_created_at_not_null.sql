@@ -0,0 +1,8 @@
+-- Ключ курсора не может быть NULL: строка с NULL в (created_at, id) < (?, ?) выпадает из всех страниц после первой.
+-- Постраничные списки проектов (projects?user_id=, admin-stats?action=projects) и каталог (sort=newest)
+-- идут по (created_at, id); время создания без значения берётся из updated_at, как в DEFAULT колонки
+UPDATE projects SET created_at = COALESCE(updated_at, TIMESTAMP '1970-01-01') WHERE created_at IS NULL;
+ALTER TABLE projects ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE supplier_products SET created_at = COALESCE(updated_at, TIMESTAMP '1970-01-01') WHERE created_at IS NULL;
+ALTER TABLE supplier_products ALTER COLUMN created_at SET NOT NULL;
@@ -0,0 +1,24 @@
+-- Лента изменений каталога идёт по change_xid (V0017): версия из последовательности и индексы
+-- по version и updated_at после этого не читаются ни одним запросом. Триггер оставляет только
+-- updated_at (момент записи строки) и номер транзакции последней записи
+CREATE OR REPLACE FUNCTION supplier_products_set_change() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    NEW.change_xid := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+DROP TRIGGER IF EXISTS supplier_products_version ON supplier_products;
+
+CREATE TRIGGER supplier_products_change BEFORE INSERT OR UPDATE ON supplier_products
+    FOR EACH ROW EXECUTE FUNCTION supplier_products_set_change();
+
+DROP FUNCTION IF EXISTS supplier_products_set_version();
+
+DROP INDEX IF EXISTS idx_supplier_products_version;
+DROP INDEX IF EXISTS idx_supplier_products_updated_at;
+
+ALTER TABLE supplier_products DROP COLUMN IF EXISTS version;
+
+DROP SEQUENCE IF EXISTS supplier_products_version_seq;
@@ -0,0 +1,2 @@
+-- Поиск каталога по артикулу (suppliers GET ?search=): p.sku ILIKE '%фрагмент%' по триграммам
+CREATE INDEX IF NOT EXISTS idx_supplier_products_sku_trgm ON supplier_products USING GIN (sku gin_trgm_ops);
@@ -92,8 +92,8 @@ export const AdminStats = () => {
   const fetchProjects = async () => {
     try {
       const url = statusFilter === 'all' 
-        ? `${ADMIN_API_URL}?action=projects&limit=100`
-        : `${ADMIN_API_URL}?action=projects&limit=100&status=${statusFilter}`;
+        ? `${ADMIN_API_URL}?action=projects&limit=100&total=none`
+        : `${ADMIN_API_URL}?action=projects&limit=100&total=none&status=${statusFilter}`;
       
       const response = await fetch(url, {
         headers: {
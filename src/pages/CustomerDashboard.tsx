@@ -8,6 +8,7 @@ import { CreateProjectForm } from '@/components/projects/CreateProjectForm';
 import ProjectDetails from '@/pages/ProjectDetails';
 
 const PROJECTS_API_URL = 'https://functions.poehali.dev/91a90ccd-9392-4390-8d40-9b2eb3908daa';
+const PROJECTS_PAGE_SIZE = 50;
 
 interface User {
   id: number;
@@ -37,18 +38,33 @@ interface CustomerDashboardProps {
 
 export const CustomerDashboard = ({ user, onLogout }: CustomerDashboardProps) => {
   const [projects, setProjects] = useState<Project[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [showCreateForm, setShowCreateForm] = useState(false);
   const [selectedProjectId, setSelectedProjectId] = useState<number | null>(null);
   const { toast } = useToast();
 
+  const fetchProjects = async (cursor: string | null) => {
+    const params = new URLSearchParams({
+      user_id: String(user.id),
+      fields: 'id,title,address,project_type,area,rooms,budget,status,progress,created_at',
+      limit: String(PROJECTS_PAGE_SIZE)
+    });
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    const response = await fetch(`${PROJECTS_API_URL}?${params}`);
+    return response.json();
+  };
+
   const loadProjects = async () => {
     setIsLoading(true);
     try {
-      const response = await fetch(`${PROJECTS_API_URL}?user_id=${user.id}`);
-      const data = await response.json();
+      const data = await fetchProjects(null);
       if (data.projects) {
         setProjects(data.projects);
+        setNextCursor(data.next_cursor || null);
       }
     } catch (error) {
       toast({
@@ -61,6 +77,26 @@ export const CustomerDashboard = ({ user, onLogout }: CustomerDashboardProps) =>
     }
   };
 
+  const loadMoreProjects = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const data = await fetchProjects(nextCursor);
+      if (data.projects) {
+        setProjects((current) => [...current, ...data.projects]);
+        setNextCursor(data.next_cursor || null);
+      }
+    } catch (error) {
+      toast({
+        title: 'Ошибка',
+        description: 'Не удалось загрузить проекты',
+        variant: 'destructive'
+      });
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     loadProjects();
   }, [user.id]);
@@ -202,6 +238,21 @@ export const CustomerDashboard = ({ user, onLogout }: CustomerDashboardProps) =>
                     </CardContent>
                   </Card>
                 ))}
+                {nextCursor && (
+                  <Button
+                    variant="outline"
+                    className="w-full"
+                    onClick={loadMoreProjects}
+                    disabled={isLoadingMore}
+                  >
+                    {isLoadingMore ? (
+                      <Icon name="Loader2" size={18} className="mr-2 animate-spin" />
+                    ) : (
+                      <Icon name="ChevronDown" size={18} className="mr-2" />
+                    )}
+                    Показать ещё
+                  </Button>
+                )}
               </div>
             )}
           </CardContent>